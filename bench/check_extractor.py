@@ -0,0 +1,60 @@
+"""مقایسه خروجی PostExtractor با مسیر BeautifulSoup روی صفحات ذخیره‌شده و بنچمارک CPU و حافظه
+
+اجرا:
+    python bench/check_extractor.py [--iterations 200]
+"""
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+
+from common import load_bot, load_fixtures
+
+
+def measure(func, html, iterations):
+    """زمان CPU هر صفحه (میلی‌ثانیه) و اوج حافظه تخصیص‌یافته (کیلوبایت)"""
+    started = time.process_time()
+    for _ in range(iterations):
+        func(html)
+    cpu_ms = (time.process_time() - started) * 1000 / iterations
+    tracemalloc.start()
+    func(html)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return round(cpu_ms, 3), round(peak / 1024, 1)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--iterations', type=int, default=200)
+    args = parser.parse_args()
+
+    bot = load_bot()
+    report = {}
+    mismatches = 0
+    for name, html in load_fixtures().items():
+        expected = bot.extract_posts_soup(html)
+        actual = bot.extract_posts_fast(html)
+        if actual != expected:
+            mismatches += 1
+            print(f"عدم تطابق در {name}:", file=sys.stderr)
+            for old, new in zip(expected, actual or []):
+                if old != new:
+                    print(f"  soup: {old!r}\n  fast: {new!r}", file=sys.stderr)
+        soup_cpu, soup_peak = measure(bot.extract_posts_soup, html, args.iterations)
+        fast_cpu, fast_peak = measure(bot.extract_posts_fast, html, args.iterations)
+        report[name] = {
+            'posts': len(expected),
+            'match': actual == expected,
+            'soup_cpu_ms': soup_cpu,
+            'fast_cpu_ms': fast_cpu,
+            'soup_peak_kb': soup_peak,
+            'fast_peak_kb': fast_peak,
+        }
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
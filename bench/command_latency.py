@@ -0,0 +1,138 @@
+"""مقایسه زمان رفت‌وبرگشت دستورات ادمین در حالت polling و webhook
+
+main() واقعی با Bot API ساختگی اجرا می‌شود. در حالت polling آپدیت ضبط‌شده از طریق
+getUpdates ساختگی (long polling) تحویل داده می‌شود و در حالت webhook با POST به گیرنده
+محلی. زمان از تحویل آپدیت تا رسیدن پاسخ (sendMessage) به Bot API ساختگی اندازه‌گیری می‌شود.
+هر حالت در پردازه جدا اجرا می‌شود:
+
+    python bench/command_latency.py --requests 200
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from common import BENCH_DIR, FIXTURES_DIR, load_bot
+from post_update import load_update
+
+SECRET = 'bench_secret'
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+async def run_mode(args):
+    """اجرای args.requests دستور در یک حالت و برگرداندن آمار زمان پاسخ"""
+    from telegram.ext import ApplicationBuilder
+    from fake_bot_api import FakeBotRequest
+    import httpx
+
+    bot = load_bot()
+    logging.getLogger().setLevel(logging.WARNING)
+    bot.logger.setLevel(logging.WARNING)
+
+    port = free_port()
+    with open('config.json', 'w') as f:
+        json.dump({
+            'bot_token': '123456:BENCH',
+            'admin_ids': [],
+            'channels': [],
+            'run_mode': args.mode,
+            'webhook_listen': '127.0.0.1',
+            'webhook_port': port,
+            'webhook_path': 'telegram',
+            'webhook_url': 'https://bench.invalid/telegram',
+            'webhook_secret': SECRET,
+        }, f)
+
+    replied = asyncio.Event()
+
+    class LatencyRequest(FakeBotRequest):
+        async def do_request(self, url, method, request_data=None, *rest, **kwargs):
+            result = await super().do_request(url, method, request_data, *rest, **kwargs)
+            if url.endswith('/sendMessage'):
+                replied.set()
+            return result
+
+    request = LatencyRequest(latency=args.bot_latency)
+
+    class BenchApplicationBuilder(ApplicationBuilder):
+        def build(self):
+            self.request(request).get_updates_request(request)
+            return super().build()
+
+    bot.ApplicationBuilder = BenchApplicationBuilder
+    task = asyncio.create_task(bot.main())
+    while bot.STARTUP_STATS['ready'] is None:
+        if task.done():
+            task.result()
+        await asyncio.sleep(0.01)
+
+    path = os.path.join(FIXTURES_DIR, 'update_start.json')
+    latencies = []
+    async with httpx.AsyncClient() as client:
+        for _ in range(args.requests):
+            update = load_update(path)
+            replied.clear()
+            started = time.perf_counter()
+            if args.mode == 'webhook':
+                response = await client.post(
+                    f'http://127.0.0.1:{port}/telegram', json=update,
+                    headers={'X-Telegram-Bot-Api-Secret-Token': SECRET}
+                )
+                response.raise_for_status()
+            else:
+                request.push_update(update)
+            await asyncio.wait_for(replied.wait(), 10)
+            latencies.append(time.perf_counter() - started)
+
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    latencies.sort()
+    return {
+        'mode': args.mode,
+        'requests': len(latencies),
+        'bot_latency': args.bot_latency,
+        'median_ms': round(statistics.median(latencies) * 1000, 2),
+        'p95_ms': round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 2),
+        'max_ms': round(latencies[-1] * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mode', choices=('polling', 'webhook'), help=argparse.SUPPRESS)  # اجرای یک حالت در پردازه فرزند
+    parser.add_argument('--requests', type=int, default=200, help='تعداد دستور در هر حالت')
+    parser.add_argument('--bot-latency', type=float, default=0.0, help='تأخیر ساختگی هر درخواست Bot API (ثانیه)')
+    args = parser.parse_args()
+
+    if args.mode:
+        with tempfile.TemporaryDirectory() as workdir:
+            os.chdir(workdir)
+            print(json.dumps(asyncio.run(run_mode(args))))
+        return 0
+
+    results = []
+    for mode in ('polling', 'webhook'):
+        output = subprocess.check_output(
+            [sys.executable, os.path.join(BENCH_DIR, 'command_latency.py'), '--mode', mode,
+             '--requests', str(args.requests), '--bot-latency', str(args.bot_latency)],
+            cwd=BENCH_DIR, text=True
+        )
+        results.append(json.loads(output.strip().splitlines()[-1]))
+    print(json.dumps(results, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,30 @@
+"""ابزارهای مشترک اسکریپت‌های بنچمارک"""
+import glob
+import importlib.util
+import os
+import sys
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+FIXTURES_DIR = os.path.join(BENCH_DIR, 'fixtures')
+BOT_FILE = os.path.join(ROOT_DIR, 'botفارسی.py')
+
+
+def load_bot():
+    """بارگذاری ماژول ربات از روی مسیر فایل (نام فایل قابل import مستقیم نیست)"""
+    if 'bot' in sys.modules:
+        return sys.modules['bot']
+    spec = importlib.util.spec_from_file_location('bot', BOT_FILE)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules['bot'] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def load_fixtures():
+    """برگرداندن {نام کانال: HTML} برای همه صفحات ذخیره‌شده t.me/s"""
+    fixtures = {}
+    for path in sorted(glob.glob(os.path.join(FIXTURES_DIR, '*.html'))):
+        with open(path, 'r', encoding='utf-8') as f:
+            fixtures[os.path.splitext(os.path.basename(path))[0]] = f.read()
+    return fixtures
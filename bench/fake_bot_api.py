@@ -0,0 +1,119 @@
+"""جایگزین محلی Bot API تلگرام و صفحات t.me/s برای بنچمارک (بدون شبکه)
+
+FakeBotRequest به‌جای HTTPXRequest به python-telegram-bot داده می‌شود و می‌تواند
+تأخیر و پاسخ 429 (RetryAfter) تزریق کند. make_tme_transport صفحات ذخیره‌شده
+bench/fixtures را به‌جای t.me برمی‌گرداند.
+"""
+import asyncio
+import json
+import random
+import time
+
+import httpx
+from telegram.request import BaseRequest
+
+
+class FakeBotRequest(BaseRequest):
+    """پاسخ‌دهنده ساختگی Bot API با تأخیر و نرخ خطای 429 قابل تنظیم"""
+
+    def __init__(self, latency=0.0, rate_limit_ratio=0.0, retry_after=1, seed=0):
+        self.latency = latency
+        self.rate_limit_ratio = rate_limit_ratio
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.calls = {}
+        self.rate_limited = 0
+        self._message_id = 0
+        self._updates = asyncio.Queue()
+        self._update_id = 0
+
+    def push_update(self, update):
+        """افزودن آپدیت (dict) برای پاسخ getUpdates؛ مثل long polling بلافاصله تحویل داده می‌شود"""
+        self._update_id += 1
+        self._updates.put_nowait({**update, 'update_id': self._update_id})
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None,
+                         write_timeout=None, connect_timeout=None, pool_timeout=None):
+        endpoint = url.rsplit('/', 1)[-1]
+        self.calls[endpoint] = self.calls.get(endpoint, 0) + 1
+        parameters = request_data.parameters if request_data is not None else {}
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if endpoint == 'getUpdates':
+            # long polling ساختگی: آپدیت‌های push_update یا پاسخ خالی پس از حداکثر یک ثانیه
+            try:
+                update = await asyncio.wait_for(self._updates.get(), min(float(parameters.get('timeout') or 0), 1) or 0.01)
+            except asyncio.TimeoutError:
+                update = None
+            return 200, json.dumps({'ok': True, 'result': [update] if update else []}).encode()
+        if endpoint == 'sendMessage' and self.random.random() < self.rate_limit_ratio:
+            self.rate_limited += 1
+            return 429, json.dumps({
+                'ok': False,
+                'error_code': 429,
+                'description': f'Too Many Requests: retry after {self.retry_after}',
+                'parameters': {'retry_after': self.retry_after},
+            }).encode()
+        return 200, json.dumps({'ok': True, 'result': self._result(endpoint, parameters)}).encode()
+
+    def _chat(self, chat_id):
+        return {'id': -1000000000000 - abs(hash(str(chat_id))) % 10 ** 9, 'type': 'channel', 'title': str(chat_id)}
+
+    def _result(self, endpoint, parameters):
+        if endpoint == 'getMe':
+            return {'id': 1, 'is_bot': True, 'first_name': 'bench', 'username': 'bench_bot'}
+        if endpoint == 'getChat':
+            return self._chat(parameters.get('chat_id'))
+        if endpoint == 'getChatMember':
+            return {
+                'status': 'administrator',
+                'user': {'id': parameters.get('user_id', 1), 'is_bot': True, 'first_name': 'bench'},
+                'can_be_edited': False, 'is_anonymous': False, 'can_manage_chat': True,
+                'can_delete_messages': True, 'can_manage_video_chats': False, 'can_restrict_members': False,
+                'can_promote_members': False, 'can_change_info': False, 'can_invite_users': True,
+                'can_post_messages': True, 'can_edit_messages': True,
+            }
+        if endpoint in ('sendMessage', 'editMessageText'):
+            return self._message(parameters.get('chat_id'), text=parameters.get('text', ''))
+        if endpoint == 'sendPhoto':
+            return self._message(parameters.get('chat_id'), photo=[self._file(parameters.get('photo'))])
+        if endpoint == 'sendVideo':
+            return self._message(parameters.get('chat_id'), video=self._file(parameters.get('video')))
+        if endpoint == 'sendMediaGroup':
+            return [
+                self._message(parameters.get('chat_id'), **(
+                    {'photo': [self._file(item['media'])]} if item['type'] == 'photo'
+                    else {'video': self._file(item['media'])}
+                ))
+                for item in parameters.get('media', [])
+            ]
+        return True
+
+    def _message(self, chat_id, **content):
+        self._message_id += 1
+        return {'message_id': self._message_id, 'date': int(time.time()), 'chat': self._chat(chat_id), **content}
+
+    def _file(self, media):
+        # آدرس یا file_id ارسال‌شده به file_id ثابت تبدیل می‌شود
+        file_id = media if isinstance(media, str) and not media.startswith('http') else f"file-{abs(hash(str(media))) % 10 ** 9}"
+        return {'file_id': file_id, 'file_unique_id': file_id[-16:], 'width': 1, 'height': 1, 'duration': 1}
+
+
+def make_tme_transport(pages, latency=0.0):
+    """ترنسپورت httpx که برای هر کانال یکی از صفحات ذخیره‌شده را برمی‌گرداند"""
+    names = sorted(pages)
+
+    async def handler(request):
+        if latency:
+            await asyncio.sleep(latency)
+        channel = request.url.path.rstrip('/').rsplit('/', 1)[-1]
+        index = int(channel.rsplit('_', 1)[-1]) if channel.rsplit('_', 1)[-1].isdigit() else 0
+        return httpx.Response(200, text=pages[names[index % len(names)]])
+
+    return httpx.MockTransport(handler)
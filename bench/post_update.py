@@ -0,0 +1,55 @@
+"""ارسال یک Update ضبط‌شده (JSON) به گیرنده webhook محلی ربات
+
+مثل تلگرام درخواست POST با هدر X-Telegram-Bot-Api-Secret-Token می‌فرستد:
+
+    python bench/post_update.py http://127.0.0.1:8443/telegram --secret MY_SECRET
+    python bench/post_update.py http://127.0.0.1:8443/telegram --file my_update.json --text /stats
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import httpx
+
+from common import FIXTURES_DIR
+
+
+def load_update(path, text=None):
+    """خواندن Update ضبط‌شده با update_id و تاریخ تازه (و متن دلخواه)"""
+    with open(path, 'r', encoding='utf-8') as f:
+        update = json.load(f)
+    update['update_id'] = int(time.time() * 1000) % 2 ** 31
+    message = update.get('message')
+    if message is not None:
+        message['date'] = int(time.time())
+        if text is not None:
+            message['text'] = text
+            command = text.split()[0]
+            message['entities'] = [{'offset': 0, 'length': len(command), 'type': 'bot_command'}] if command.startswith('/') else []
+    return update
+
+
+def post_update(url, update, secret=None, timeout=10):
+    headers = {'X-Telegram-Bot-Api-Secret-Token': secret} if secret else {}
+    started = time.perf_counter()
+    response = httpx.post(url, json=update, headers=headers, timeout=timeout)
+    return response.status_code, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('url', help='آدرس گیرنده webhook (مثلاً http://127.0.0.1:8443/telegram)')
+    parser.add_argument('--secret', help='مقدار webhook_secret')
+    parser.add_argument('--file', default=os.path.join(FIXTURES_DIR, 'update_start.json'), help='فایل Update ضبط‌شده')
+    parser.add_argument('--text', help='جایگزینی متن پیام (مثلاً /getconfig)')
+    args = parser.parse_args()
+
+    status, elapsed = post_update(args.url, load_update(args.file, args.text), args.secret)
+    print(f"HTTP {status} در {elapsed * 1000:.1f} میلی‌ثانیه")
+    return 0 if status == 200 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
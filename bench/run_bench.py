@@ -0,0 +1,158 @@
+"""اجرای خط لوله واقعی check_new_posts روی صفحات ذخیره‌شده و Bot API ساختگی
+
+هر اندازه (تعداد کانال مبدأ) در یک پردازه جدا اجرا می‌شود تا اوج RSS قابل مقایسه باشد.
+خروجی JSON است و می‌توان آن را بین نسخه‌ها مقایسه کرد:
+
+    python bench/run_bench.py --sizes 1 50 500 2000 --output bench_output.txt
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from common import BENCH_DIR, ROOT_DIR, load_bot, load_fixtures
+
+DEFAULT_SIZES = (1, 50, 500, 2000)
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT_DIR, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run_size(args):
+    """یک دور کامل check_new_posts برای args.sources کانال"""
+    from telegram.ext import ApplicationBuilder
+    from fake_bot_api import FakeBotRequest, make_tme_transport
+    import httpx
+
+    bot = load_bot()
+    logging.getLogger().setLevel(logging.WARNING)
+    bot.logger.setLevel(logging.WARNING)
+
+    pages = load_fixtures()
+    names = sorted(pages)
+    config = {
+        'bot_token': '123456:BENCH',
+        'admin_ids': [],
+        'channels': [
+            {
+                'source_url': f'https://t.me/s/bench_{i}',
+                'dest_channels': [f'@bench_dest_{i}_{j}' for j in range(args.dests)],
+                'is_active': True,
+                'word_replacements': [{'word': 'BUY', 'replacement': 'LONG'}, {'word': 'SELL', 'replacement': 'SHORT'}],
+                'blacklist': ['casino'],
+                'whitelist': [],
+            }
+            for i in range(args.sources)
+        ],
+    }
+    # یک دور کامل سنجیده می‌شود، پس دور منتظر همه کانال‌ها می‌ماند
+    config['tick_deadline'] = 0
+    if args.parse_workers:
+        config['parse_workers'] = args.parse_workers
+    if not args.real_limits:
+        # سنجش خود خط لوله، نه محدودکننده نرخ
+        config.update({'delivery_global_rate': 10 ** 6, 'delivery_chat_rate': 10 ** 6, 'delivery_chat_burst': 10 ** 6})
+    with open('config.json', 'w') as f:
+        json.dump(config, f)
+
+    # cursor هر کانال طوری تنظیم می‌شود که args.new_posts پست آخر صفحه جدید باشند
+    for i in range(args.sources):
+        post_ids = [post[0] for post in bot.extract_posts_fast(pages[names[i % len(names)]])]
+        bot.state_store.set_cursor(f'https://t.me/s/bench_{i}', post_ids[-args.new_posts - 1])
+    bot.state_store.commit()
+
+    bot._http_client = httpx.AsyncClient(transport=make_tme_transport(pages, args.page_latency))
+    request = FakeBotRequest(latency=args.bot_latency, rate_limit_ratio=args.rate_limit_ratio)
+    application = ApplicationBuilder().token(config['bot_token']).request(request).get_updates_request(FakeBotRequest()).build()
+    await application.initialize()
+
+    cpu_started = time.process_time()
+    wall_started = time.perf_counter()
+    await bot.check_new_posts(application)
+    wall = time.perf_counter() - wall_started
+    cpu = time.process_time() - cpu_started
+
+    await application.shutdown()
+    await bot.delivery_queue.stop()
+    await bot.close_http_client()
+    bot.shutdown_parse_pool()
+    bot.config_store.flush()
+    bot.state_store.close()
+
+    sends = bot.DELIVERY_STATS['sent']
+    posts = sends / args.dests if args.dests else 0
+    return {
+        'sources': args.sources,
+        'dests_per_source': args.dests,
+        'parse_workers': args.parse_workers,
+        'tick_wall_seconds': round(wall, 4),
+        'posts_delivered': posts,
+        'messages_sent': sends,
+        'posts_per_second': round(posts / wall, 2) if wall else None,
+        'cpu_ms_per_post': round(cpu * 1000 / posts, 3) if posts else None,
+        'cpu_seconds': round(cpu, 4),
+        'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        'rate_limited_responses': request.rate_limited,
+        'bot_api_calls': request.calls,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES))
+    parser.add_argument('--sources', type=int, help=argparse.SUPPRESS)  # اجرای یک اندازه در پردازه فرزند
+    parser.add_argument('--dests', type=int, default=2, help='تعداد مقصد هر کانال')
+    parser.add_argument('--new-posts', type=int, default=3, help='تعداد پست جدید هر کانال در این دور')
+    parser.add_argument('--page-latency', type=float, default=0.05, help='تأخیر ساختگی t.me (ثانیه)')
+    parser.add_argument('--bot-latency', type=float, default=0.02, help='تأخیر ساختگی Bot API (ثانیه)')
+    parser.add_argument('--rate-limit-ratio', type=float, default=0.0, help='نسبت پاسخ‌های 429 در sendMessage')
+    parser.add_argument('--parse-workers', type=int, default=0, help='تعداد پردازه‌های پارس (parse_workers)')
+    parser.add_argument('--real-limits', action='store_true', help='استفاده از محدودیت‌های نرخ واقعی تلگرام')
+    parser.add_argument('--output', help='مسیر فایل خروجی JSON (پیش‌فرض stdout)')
+    return parser.parse_args(argv)
+
+
+def main():
+    args = parse_args()
+    if args.sources is not None:
+        with tempfile.TemporaryDirectory() as workdir:
+            os.chdir(workdir)
+            print(json.dumps(asyncio.run(run_size(args))))
+        return 0
+
+    results = []
+    child_args = [
+        '--dests', str(args.dests), '--new-posts', str(args.new_posts),
+        '--page-latency', str(args.page_latency), '--bot-latency', str(args.bot_latency),
+        '--rate-limit-ratio', str(args.rate_limit_ratio), '--parse-workers', str(args.parse_workers),
+    ] + (['--real-limits'] if args.real_limits else [])
+    for size in args.sizes:
+        output = subprocess.check_output(
+            [sys.executable, os.path.join(BENCH_DIR, 'run_bench.py'), '--sources', str(size)] + child_args,
+            cwd=BENCH_DIR, text=True
+        )
+        result = json.loads(output.strip().splitlines()[-1])
+        print(f"{size} کانال: {result['tick_wall_seconds']} ثانیه، {result['posts_per_second']} پست در ثانیه", file=sys.stderr)
+        results.append(result)
+
+    report = json.dumps({'revision': git_revision(), 'parameters': vars(args), 'results': results}, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(report + '\n')
+    else:
+        print(report)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
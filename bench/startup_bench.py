@@ -0,0 +1,113 @@
+"""اندازه‌گیری زمان راه‌اندازی: import ماژول، آماده شدن (شروع polling) و اولین ارسال
+
+main() واقعی با Bot API ساختگی و صفحات ذخیره‌شده اجرا می‌شود. هر اجرا در پردازه جدید
+انجام می‌شود تا زمان import ماژول ربات هم جداگانه اندازه‌گیری شود. زمان‌های ready و
+first_delivery از فراخوانی main() حساب می‌شوند:
+
+    python bench/startup_bench.py --sources 200 --dests 3
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+
+from common import load_fixtures
+
+
+async def run(args):
+    import_started = time.monotonic()
+    from common import load_bot
+    bot = load_bot()
+    import_seconds = time.monotonic() - import_started
+
+    from telegram.ext import ApplicationBuilder
+    from fake_bot_api import FakeBotRequest, make_tme_transport
+    import httpx
+
+    logging.getLogger().setLevel(logging.WARNING)
+    bot.logger.setLevel(logging.WARNING)
+    # لغو jobهای در حال اجرا هنگام توقف main() در apscheduler خطا ثبت می‌کند
+    logging.getLogger('apscheduler').setLevel(logging.CRITICAL)
+
+    pages = load_fixtures()
+    names = sorted(pages)
+    config = {
+        'bot_token': '123456:BENCH',
+        'admin_ids': [],
+        'channels': [
+            {
+                'source_url': f'https://t.me/s/bench_{i}',
+                'dest_channels': [f'@bench_dest_{i}_{j}' for j in range(args.dests)],
+                'is_active': True,
+                'word_replacements': [],
+                'blacklist': [],
+                'whitelist': [],
+            }
+            for i in range(args.sources)
+        ],
+    }
+    with open('config.json', 'w') as f:
+        json.dump(config, f)
+    # هر کانال یک پست جدید دارد تا اولین دور اسکرپ چیزی برای ارسال داشته باشد
+    post_ids = {name: [post[0] for post in bot.extract_posts_fast(html)] for name, html in pages.items()}
+    for i in range(args.sources):
+        bot.state_store.set_cursor(f'https://t.me/s/bench_{i}', post_ids[names[i % len(names)]][-2])
+    bot.state_store.commit()
+    bot._http_client = httpx.AsyncClient(transport=make_tme_transport(pages, args.page_latency))
+
+    request = FakeBotRequest(latency=args.bot_latency)
+
+    class BenchApplicationBuilder(ApplicationBuilder):
+        def build(self):
+            self.request(request).get_updates_request(FakeBotRequest())
+            return super().build()
+
+    bot.ApplicationBuilder = BenchApplicationBuilder
+    main_started = time.monotonic()
+    task = asyncio.create_task(bot.main())
+    total_dests = args.sources * args.dests
+    while time.monotonic() - main_started < args.timeout:
+        probed = len(bot.reachability._entries)
+        if bot.STARTUP_STATS['first_delivery'] is not None and probed >= total_dests:
+            break
+        if task.done():
+            task.result()
+        await asyncio.sleep(0.01)
+    calls = dict(request.calls)
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+
+    # STARTUP_STATS نسبت به زمان import ماژول است؛ اینجا نسبت به فراخوانی main() گزارش می‌شود
+    offset = bot.STARTED_AT - main_started
+    stats = bot.STARTUP_STATS
+    return {
+        'sources': args.sources,
+        'dests_per_source': args.dests,
+        'import_seconds': round(import_seconds, 4),
+        'ready_seconds': round(stats['ready'] + offset, 4) if stats['ready'] is not None else None,
+        'first_delivery_seconds': round(stats['first_delivery'] + offset, 4) if stats['first_delivery'] is not None else None,
+        'destinations_probed': len(bot.reachability._entries),
+        'bot_api_calls': calls,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sources', type=int, default=200)
+    parser.add_argument('--dests', type=int, default=3, help='تعداد مقصد هر کانال')
+    parser.add_argument('--page-latency', type=float, default=0.05, help='تأخیر ساختگی t.me (ثانیه)')
+    parser.add_argument('--bot-latency', type=float, default=0.02, help='تأخیر ساختگی Bot API (ثانیه)')
+    parser.add_argument('--timeout', type=float, default=120, help='حداکثر زمان انتظار (ثانیه)')
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        print(json.dumps(asyncio.run(run(args)), indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
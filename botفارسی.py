@@ -1,213 +1,1987 @@
 import logging
-import requests
-from bs4 import BeautifulSoup
-from telegram.ext import ApplicationBuilder, CommandHandler
-from telegram.error import TelegramError
+import httpx
+from telegram import ChatMember, InputMediaPhoto, InputMediaVideo
+from telegram.ext import ApplicationBuilder, CommandHandler, MessageHandler, filters
+from telegram.error import TelegramError, RetryAfter, TimedOut, NetworkError, BadRequest, Forbidden
 import asyncio
 import re
 import os
 import json
+import time
+import hashlib
+import random
+import threading
+import bisect
+import signal
+import argparse
+import multiprocessing
+import tempfile
+import csv
+import io
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import sqlite3
+from html import unescape
+from html.parser import HTMLParser
 
 # تنظیم لاگینگ
 logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
 logger = logging.getLogger(__name__)
+logging.getLogger('httpx').setLevel(logging.WARNING)  # جلوگیری از لاگ شدن هر درخواست
+
+# زمان شروع پردازه برای اندازه‌گیری زمان آماده شدن و اولین ارسال
+STARTED_AT = time.monotonic()
 
 # فایل تنظیمات
 CONFIG_FILE = 'config.json'
-STATE_FILE = 'last_post_ids.json'
+STATE_FILE = 'last_post_ids.json'  # فایل قدیمی؛ فقط برای انتقال خودکار به STATE_DB
+STATE_DB = 'state.db'
 CHECK_INTERVAL = 30
+TICK_DEADLINE = 25  # مهلت هر دور چک؛ کانال‌هایی که تمام نشوند در پس‌زمینه ادامه می‌دهند و دور بعد با اولویت بررسی می‌شوند (ثانیه، 0 یعنی بدون مهلت)
+FETCH_CONCURRENCY = 20  # حداکثر تعداد درخواست هم‌زمان به t.me
+FETCH_TIMEOUT = 15  # مهلت هر درخواست (ثانیه)
+CONFIG_FLUSH_DELAY = 1  # تأخیر ذخیره تنظیمات روی دیسک پس از هر تغییر (ثانیه)
+CONFIG_RELOAD_INTERVAL = 5  # فاصله بررسی تغییر فایل تنظیمات برای بارگذاری مجدد (ثانیه)
+PARSE_WORKERS = 0  # تعداد پردازه‌های پارس صفحه (0 یعنی پارس در همین پردازه)
+CATCHUP_MAX_POSTS = 20  # حداکثر تعداد پست عقب‌افتاده که در یک دور ارسال می‌شود
+DELIVERY_GLOBAL_RATE = 30  # محدودیت کلی Bot API (پیام در ثانیه)
+DELIVERY_CHAT_RATE = 20 / 60  # محدودیت هر کانال/گروه مقصد (پیام در ثانیه)
+DELIVERY_CHAT_BURST = 3  # تعداد پیامی که می‌توان بدون انتظار به یک مقصد فرستاد
+DELIVERY_WORKERS = 30  # تعداد ارسال هم‌زمان
+DELIVERY_MAX_RETRIES = 5  # حداکثر تلاش مجدد برای خطاهای موقت شبکه
+DELIVERY_BACKOFF_MAX = 60  # سقف فاصله تلاش مجدد (ثانیه)
+POLL_MIN_INTERVAL = 5  # کمترین فاصله بررسی برای کانال‌های پرفعالیت (ثانیه)
+POLL_MAX_INTERVAL = 300  # بیشترین فاصله بررسی برای کانال‌های کم‌فعالیت (ثانیه)
+POLL_BACKOFF = 1.25  # ضریب افزایش فاصله پس از هر بررسی بدون پست جدید
+POLL_JITTER = 0.1  # نوسان تصادفی فاصله‌ها برای پخش بار (نسبت)
+SHARD_VNODES = 64  # تعداد گره مجازی هر shard در حلقه هش سازگار
+SHARD_LEASE_TTL = 120  # مدت اعتبار قفل هر کانال مبدأ در حالت shard (ثانیه)
+SHARD_CHECK_INTERVAL = 10  # فاصله بررسی زنده بودن پردازه‌های shard (ثانیه)
+METRICS_HOST = '127.0.0.1'  # آدرس سرور متریک (با تنظیم metrics_port فعال می‌شود)
+METRICS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 15, 30)
+DEDUP_WINDOW = 300  # پنجره حذف پست تکراری از کانال‌های مبدأ مختلف برای هر مقصد (ثانیه، 0 یعنی غیرفعال)
+DEDUP_MAX_ENTRIES = 2000  # حداکثر اثر انگشت نگه‌داشته‌شده برای هر مقصد
+REACHABILITY_TTL = 600  # مدت اعتبار نتیجه بررسی دسترسی به مقصد (ثانیه)
+REACHABILITY_REPROBE_INTERVAL = 120  # فاصله بررسی مجدد مقصدهای غیرقابل دسترس (ثانیه)
+MEDIA_CAPTION_LIMIT = 1024  # حداکثر طول کپشن رسانه در Bot API (متن بلندتر جداگانه ارسال می‌شود)
+FILE_ID_CACHE_SIZE = 1000  # حداکثر تعداد file_id رسانه‌های ارسال‌شده که برای مقصدهای بعدی نگه‌داشته می‌شود
+MEDIA_MAX_UPLOAD_BYTES = 50 * 1024 * 1024  # سقف حجم آپلود رسانه در Bot API (بایت)
+MEDIA_SPOOL_BYTES = 1024 * 1024  # رسانه دانلودشده تا این حجم در حافظه و بیشتر از آن روی دیسک نگه‌داشته می‌شود
+MEDIA_UPLOAD_TIMEOUT = 120  # مهلت دانلود و آپلود رسانه (ثانیه)
+ALERT_FLUSH_INTERVAL = 60  # فاصله ارسال خلاصه خطاها به ادمین‌ها (ثانیه)
+ALERT_RATE = 1  # محدودیت ارسال پیام به ادمین‌ها، جدا از ارسال به کانال‌ها (پیام در ثانیه)
+ALERT_BURST = 3  # تعداد پیام ادمین که می‌توان بدون انتظار فرستاد
+ALERT_DIGEST_LIMIT = 4000  # حداکثر طول هر پیام خلاصه (سقف پیام تلگرام 4096 است)
+PROBE_CONCURRENCY = 20  # حداکثر بررسی هم‌زمان دسترسی به مقصدها
+STARTUP_POLL_SPREAD = 5  # اولین بررسی کانال‌ها در این بازه پخش می‌شود (ثانیه)
+WEBHOOK_LISTEN = '127.0.0.1'  # آدرس گیرنده webhook (پشت reverse proxy)
+WEBHOOK_PORT = 8443  # پورت گیرنده webhook
+WEBHOOK_PATH = 'telegram'  # مسیر گیرنده webhook
+CONFIG_IMPORT_MAX_BYTES = 5 * 1024 * 1024  # حداکثر حجم فایل دستور /import (بایت)
+CSV_LIST_SEPARATOR = '|'  # جداکننده اعضای لیست در ستون‌های فایل CSV
+OUTBOX_REPLAY_BATCH = 200  # تعداد ارسال ناتمام outbox که هنگام شروع در هر دسته دوباره ارسال می‌شود
+OUTBOX_MAX_ATTEMPTS = 5  # ارسال‌هایی که این تعداد بار ناموفق بوده‌اند دیگر تکرار نمی‌شوند
+OUTBOX_COMPACT_INTERVAL = 300  # فاصله پاک‌سازی ورودی‌های انجام‌شده outbox در پس‌زمینه (ثانیه)
+DIGEST_MAX_LENGTH = 4000  # حداکثر طول هر پیام خلاصه کانال‌های حالت digest (سقف پیام تلگرام 4096 است)
+DIGEST_SEPARATOR = '\n\n➖➖➖\n\n'  # جداکننده پست‌ها در پیام خلاصه
+BREAKER_FAILURE_THRESHOLD = 3  # تعداد خطای پیاپی دریافت صفحه که بررسی کانال را موقتاً متوقف می‌کند (مدار باز)
+BREAKER_BACKOFF_BASE = 60  # مدت اولین توقف؛ هر باز شدن دوباره مدار آن را دو برابر می‌کند (ثانیه)
+BREAKER_BACKOFF_MAX = 3600  # سقف مدت توقف (ثانیه)
+BREAKER_PAUSE_FAILURES = 20  # کانالی که این تعداد بار پیاپی وجود نداشته باشد (404/410 یا هدایت به صفحه غیرعمومی) خودکار متوقف می‌شود
+MESSAGE_INDEX_SIZE = 20  # تعداد آخرین پست‌های ارسال‌شده هر کانال که ویرایش/حذف آن‌ها به مقصدها منتقل می‌شود (حدود یک صفحه t.me/s)
 USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
 
+class ConfigStore:
+    """نگهداری تنظیمات در حافظه با شمارنده نسخه، ایندکس source_url و ذخیره‌سازی اتمیک با تأخیر (write-behind)"""
+
+    def __init__(self, path):
+        self.path = path
+        self.data = None
+        self.version = 0
+        self._index = {}
+        self._mtime = None
+        self._flush_handle = None
+
+    def load(self):
+        """خواندن فایل تنظیمات و انتقال تنظیمات قدیمی به ساختار جدید"""
+        if not os.path.exists(self.path):
+            self.data = {
+                'channels': [],
+                'admin_ids': [],
+                'bot_token': None
+            }
+            self._reindex()
+            return self.data
+        with open(self.path, 'r') as f:
+            config = json.load(f)
+        self._mtime = os.stat(self.path).st_mtime_ns
+        migrated = False
+        if 'channels' not in config:
+            config['channels'] = []
+            migrated = True
+        if 'admin_ids' not in config:
+            config['admin_ids'] = []
+            migrated = True
+        # انتقال تنظیمات قدیمی به ساختار جدید
+        for channel in config['channels']:
+            for key in ('word_replacements', 'blacklist', 'whitelist'):
+                if key not in channel:
+                    channel[key] = list(config.get(key, []))
+                    migrated = True
+            if 'is_active' not in channel:
+                channel['is_active'] = True  # پیش‌فرض: کپی فعال
+                migrated = True
+        # حذف تنظیمات قدیمی از سطح اصلی
+        for key in ('word_replacements', 'blacklist', 'whitelist'):
+            if config.pop(key, None) is not None:
+                migrated = True
+        self.data = config
+        self.version += 1
+        self._reindex()
+        if migrated:
+            self.flush()
+        return self.data
+
+    def get(self):
+        """برگرداندن تنظیمات در حافظه (در اولین فراخوانی از فایل خوانده می‌شود)"""
+        if self.data is None:
+            self.load()
+        return self.data
+
+    def get_channel(self, source_url):
+        """پیدا کردن کانال با source_url در O(1)"""
+        self.get()
+        return self._index.get(source_url)
+
+    def _reindex(self):
+        self._index = {channel['source_url']: channel for channel in self.data['channels']}
+
+    def commit(self):
+        """ثبت تغییرات: افزایش نسخه، به‌روزرسانی ایندکس و زمان‌بندی ذخیره در فایل"""
+        self.version += 1
+        self._reindex()
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush()
+            return
+        if self._flush_handle is None:
+            delay = self.data.get('config_flush_delay', CONFIG_FLUSH_DELAY)
+            self._flush_handle = loop.call_later(delay, self.flush)
+
+    def flush(self):
+        """نوشتن اتمیک تنظیمات در فایل (فایل موقت + rename)"""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.data, f, indent=4)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self._mtime = os.stat(self.path).st_mtime_ns
+
+    def reload_if_changed(self):
+        """بارگذاری مجدد تنظیمات اگر فایل روی دیسک تغییر کرده باشد"""
+        if self._flush_handle is not None or not os.path.exists(self.path):
+            return False
+        if os.stat(self.path).st_mtime_ns == self._mtime:
+            return False
+        try:
+            self.load()
+        except (OSError, ValueError) as e:
+            logger.error(f"خطا در بارگذاری مجدد تنظیمات: {str(e)}")
+            return False
+        logger.info(f"تنظیمات از فایل بارگذاری مجدد شد (نسخه {self.version}).")
+        return True
+
+config_store = ConfigStore(CONFIG_FILE)
+
 # لود کردن تنظیمات
 def load_config():
-    if os.path.exists(CONFIG_FILE):
-        with open(CONFIG_FILE, 'r') as f:
-            config = json.load(f)
-            if 'channels' not in config:
-                config['channels'] = []
-            if 'admin_ids' not in config:
-                config['admin_ids'] = []
-            # انتقال تنظیمات قدیمی به ساختار جدید
-            for channel in config['channels']:
-                if 'word_replacements' not in channel:
-                    channel['word_replacements'] = config.get('word_replacements', [])
-                if 'blacklist' not in channel:
-                    channel['blacklist'] = config.get('blacklist', [])
-                if 'whitelist' not in channel:
-                    channel['whitelist'] = config.get('whitelist', [])
-                if 'is_active' not in channel:
-                    channel['is_active'] = True  # پیش‌فرض: کپی فعال
-            # حذف تنظیمات قدیمی از سطح اصلی
-            config.pop('word_replacements', None)
-            config.pop('blacklist', None)
-            config.pop('whitelist', None)
-            save_config(config)
-            return config
-    return {
-        'channels': [],
-        'admin_ids': [],
-        'bot_token': None
-    }
+    return config_store.get()
 
 # ذخیره تنظیمات
 def save_config(config):
-    with open(CONFIG_FILE, 'w') as f:
-        json.dump(config, f, indent=4)
-
-# لود کردن آخرین ID پست‌ها
-def load_last_post_ids():
-    if os.path.exists(STATE_FILE):
-        with open(STATE_FILE, 'r') as f:
-            return json.load(f)
-    return {}
-
-def save_last_post_id(source_url, post_id):
-    last_post_ids = load_last_post_ids()
-    last_post_ids[source_url] = post_id
-    with open(STATE_FILE, 'w') as f:
-        json.dump(last_post_ids, f)
+    if config is not config_store.data:
+        config_store.data = config
+    config_store.commit()
+
+class StateStore:
+    """ذخیره‌ساز تراکنشی وضعیت (SQLite در حالت WAL) برای آخرین ID پست‌ها و متادیتای کانال‌ها"""
+
+    def __init__(self, path, legacy_path=None):
+        self.path = path
+        self.legacy_path = legacy_path
+        self._conn = None
+
+    @property
+    def conn(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, timeout=30)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS cursors ('
+                'source_url TEXT PRIMARY KEY, post_id INTEGER NOT NULL, updated_at REAL NOT NULL)'
+            )
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS meta ('
+                'namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, updated_at REAL NOT NULL, '
+                'PRIMARY KEY (namespace, key))'
+            )
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS leases ('
+                'name TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL)'
+            )
+            # outbox: محتوای هر پست یک بار و برای هر مقصد یک ورودی که پس از ارسال علامت می‌خورد
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS outbox_posts ('
+                'source_url TEXT NOT NULL, post_id INTEGER NOT NULL, text TEXT NOT NULL, media TEXT NOT NULL, '
+                'created_at REAL NOT NULL, PRIMARY KEY (source_url, post_id))'
+            )
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS outbox ('
+                'source_url TEXT NOT NULL, post_id INTEGER NOT NULL, dest_channel TEXT NOT NULL, '
+                'attempts INTEGER NOT NULL DEFAULT 0, created_at REAL NOT NULL, done_at REAL, '
+                'PRIMARY KEY (source_url, post_id, dest_channel))'
+            )
+            self._conn.execute(
+                'CREATE INDEX IF NOT EXISTS outbox_pending ON outbox (source_url, post_id, dest_channel) '
+                'WHERE done_at IS NULL'
+            )
+            # شاخص پست‌های ارسال‌شده: شناسه پیام در هر مقصد و هش متنی که آن پیام دارد، برای انتقال ویرایش و حذف
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS message_index ('
+                'source_url TEXT NOT NULL, post_id INTEGER NOT NULL, hash BLOB NOT NULL, messages TEXT NOT NULL, '
+                'PRIMARY KEY (source_url, post_id))'
+            )
+            self._conn.commit()
+            self._migrate_legacy()
+        return self._conn
+
+    def _migrate_legacy(self):
+        """انتقال خودکار last_post_ids.json قدیمی به پایگاه داده"""
+        if not self.legacy_path or not os.path.exists(self.legacy_path):
+            return
+        with open(self.legacy_path, 'r') as f:
+            last_post_ids = json.load(f)
+        now = time.time()
+        self._conn.executemany(
+            'INSERT OR IGNORE INTO cursors (source_url, post_id, updated_at) VALUES (?, ?, ?)',
+            [(source_url, int(post_id), now) for source_url, post_id in last_post_ids.items() if post_id is not None]
+        )
+        self._conn.commit()
+        os.replace(self.legacy_path, f"{self.legacy_path}.migrated")
+        logger.info(f"{len(last_post_ids)} شناسه پست از {self.legacy_path} به {self.path} منتقل شد.")
+
+    def get_cursor(self, source_url):
+        """آخرین ID پست ذخیره‌شده برای کانال مبدأ یا None"""
+        row = self.conn.execute('SELECT post_id FROM cursors WHERE source_url = ?', (source_url,)).fetchone()
+        return row[0] if row else None
+
+    def set_cursor(self, source_url, post_id):
+        """ثبت آخرین ID پست (تا فراخوانی commit در تراکنش جاری می‌ماند)"""
+        self.conn.execute(
+            'INSERT INTO cursors (source_url, post_id, updated_at) VALUES (?, ?, ?) '
+            'ON CONFLICT(source_url) DO UPDATE SET post_id = excluded.post_id, updated_at = excluded.updated_at',
+            (source_url, post_id, time.time())
+        )
+
+    def delete_cursor(self, source_url):
+        self.conn.execute('DELETE FROM cursors WHERE source_url = ?', (source_url,))
+
+    def get_meta(self, namespace, key, default=None):
+        """خواندن متادیتای JSON (مثلاً وضعیت ارسال یا سلامت کانال)"""
+        row = self.conn.execute('SELECT value FROM meta WHERE namespace = ? AND key = ?', (namespace, key)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def set_meta(self, namespace, key, value):
+        self.conn.execute(
+            'INSERT INTO meta (namespace, key, value, updated_at) VALUES (?, ?, ?, ?) '
+            'ON CONFLICT(namespace, key) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at',
+            (namespace, key, json.dumps(value), time.time())
+        )
+
+    def list_meta(self, namespace):
+        """همه متادیتای یک namespace به شکل {key: value}"""
+        rows = self.conn.execute('SELECT key, value FROM meta WHERE namespace = ?', (namespace,)).fetchall()
+        return {key: json.loads(value) for key, value in rows}
+
+    def delete_meta(self, namespace, key=None):
+        if key is None:
+            self.conn.execute('DELETE FROM meta WHERE namespace = ?', (namespace,))
+        else:
+            self.conn.execute('DELETE FROM meta WHERE namespace = ? AND key = ?', (namespace, key))
+
+    def outbox_add(self, source_url, post_id, text, media, dest_channels):
+        """ثبت یک پست با یک ورودی در انتظار برای هر مقصد؛ مقصدهایی که قبلاً ثبت نشده بودند را برمی‌گرداند"""
+        now = time.time()
+        self.conn.execute(
+            'INSERT OR IGNORE INTO outbox_posts (source_url, post_id, text, media, created_at) VALUES (?, ?, ?, ?, ?)',
+            (source_url, post_id, text, json.dumps(media), now)
+        )
+        pending = []
+        for dest_channel in dest_channels:
+            cursor = self.conn.execute(
+                'INSERT OR IGNORE INTO outbox (source_url, post_id, dest_channel, created_at) VALUES (?, ?, ?, ?)',
+                (source_url, post_id, dest_channel, now)
+            )
+            if cursor.rowcount == 1:
+                pending.append(dest_channel)
+        return pending
+
+    def outbox_done(self, source_url, post_id, dest_channel):
+        """علامت زدن ارسال انجام‌شده (یا کنار گذاشته‌شده) یک پست به یک مقصد"""
+        self.conn.execute(
+            'UPDATE outbox SET done_at = ? WHERE source_url = ? AND post_id = ? AND dest_channel = ?',
+            (time.time(), source_url, post_id, dest_channel)
+        )
+
+    def outbox_failed(self, source_url, post_id, dest_channel):
+        self.conn.execute(
+            'UPDATE outbox SET attempts = attempts + 1 WHERE source_url = ? AND post_id = ? AND dest_channel = ?',
+            (source_url, post_id, dest_channel)
+        )
+
+    def outbox_pending(self, created_before, max_attempts, after=('', 0, ''), limit=OUTBOX_REPLAY_BATCH):
+        """ورودی‌های ناتمام ثبت‌شده پیش از created_before به ترتیب (source_url, post_id, dest_channel) پس از after"""
+        rows = self.conn.execute(
+            'SELECT o.source_url, o.post_id, o.dest_channel, p.text, p.media FROM outbox o '
+            'JOIN outbox_posts p ON p.source_url = o.source_url AND p.post_id = o.post_id '
+            'WHERE o.done_at IS NULL AND o.attempts < ? AND o.created_at < ? '
+            'AND (o.source_url, o.post_id, o.dest_channel) > (?, ?, ?) '
+            'ORDER BY o.source_url, o.post_id, o.dest_channel LIMIT ?',
+            (max_attempts, created_before, *after, limit)
+        ).fetchall()
+        return [
+            (source_url, post_id, dest_channel, text, tuple(tuple(item) for item in json.loads(media)))
+            for source_url, post_id, dest_channel, text, media in rows
+        ]
+
+    def outbox_count(self):
+        """تعداد ارسال‌های ناتمام"""
+        return self.conn.execute('SELECT COUNT(*) FROM outbox WHERE done_at IS NULL').fetchone()[0]
+
+    def outbox_compact(self, max_attempts):
+        """حذف ورودی‌های انجام‌شده یا بیش از حد ناموفق و پست‌های بدون ورودی؛ (انجام‌شده، رهاشده) را برمی‌گرداند"""
+        done = self.conn.execute('DELETE FROM outbox WHERE done_at IS NOT NULL').rowcount
+        dropped = self.conn.execute('DELETE FROM outbox WHERE attempts >= ?', (max_attempts,)).rowcount
+        self.conn.execute(
+            'DELETE FROM outbox_posts WHERE NOT EXISTS ('
+            'SELECT 1 FROM outbox o WHERE o.source_url = outbox_posts.source_url AND o.post_id = outbox_posts.post_id)'
+        )
+        return done, dropped
+
+    def get_message_index(self, source_url):
+        """{post_id: (هش متن مبدأ، [(dest_channel, message_id, هش متن آن پیام), ...])} برای پست‌های ارسال‌شده یک کانال"""
+        rows = self.conn.execute(
+            'SELECT post_id, hash, messages FROM message_index WHERE source_url = ?', (source_url,)
+        ).fetchall()
+        return {
+            post_id: (source_hash, [
+                (item[0], item[1], bytes.fromhex(item[2]) if len(item) > 2 else source_hash)
+                for item in json.loads(messages)
+            ])
+            for post_id, source_hash, messages in rows
+        }
+
+    def set_message_index(self, source_url, post_id, source_hash, messages, keep):
+        """ثبت پیام‌های یک پست (هش متن خام مبدأ و هش متن ارسال‌شده هر پیام) و نگه‌داشتن فقط keep پست آخر هر کانال"""
+        self.conn.execute(
+            'INSERT INTO message_index (source_url, post_id, hash, messages) VALUES (?, ?, ?, ?) '
+            'ON CONFLICT(source_url, post_id) DO UPDATE SET hash = excluded.hash, messages = excluded.messages',
+            (source_url, post_id, source_hash,
+             json.dumps([(dest_channel, message_id, message_hash.hex()) for dest_channel, message_id, message_hash in messages]))
+        )
+        self.conn.execute(
+            'DELETE FROM message_index WHERE source_url = ? AND post_id <= ('
+            'SELECT post_id FROM message_index WHERE source_url = ? ORDER BY post_id DESC LIMIT 1 OFFSET ?)',
+            (source_url, source_url, keep)
+        )
+
+    def delete_message_index(self, source_url, post_id=None):
+        if post_id is None:
+            self.conn.execute('DELETE FROM message_index WHERE source_url = ?', (source_url,))
+        else:
+            self.conn.execute('DELETE FROM message_index WHERE source_url = ? AND post_id = ?', (source_url, post_id))
+
+    def acquire_lease(self, name, owner, ttl):
+        """گرفتن (یا تمدید) قفل انحصاری بین پردازه‌ها؛ در صورت موفقیت True"""
+        now = time.time()
+        cursor = self.conn.execute(
+            'INSERT INTO leases (name, owner, expires_at) VALUES (?, ?, ?) '
+            'ON CONFLICT(name) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at '
+            'WHERE leases.owner = excluded.owner OR leases.expires_at < ?',
+            (name, owner, now + ttl, now)
+        )
+        self.conn.commit()
+        return cursor.rowcount == 1
+
+    def release_lease(self, name, owner):
+        """آزاد کردن قفل (همراه با commit بعدی ثبت می‌شود)"""
+        self.conn.execute('DELETE FROM leases WHERE name = ? AND owner = ?', (name, owner))
+
+    def commit(self):
+        """ثبت همه تغییرات تراکنش جاری (یک بار در هر دور چک)"""
+        if self._conn is not None:
+            self._conn.commit()
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.commit()
+            self._conn.close()
+            self._conn = None
+
+state_store = StateStore(STATE_DB, legacy_path=STATE_FILE)
+
+def _format_labels(labels, extra=None):
+    items = list(labels) + ([extra] if extra else [])
+    if not items:
+        return ''
+    return '{' + ','.join('{}="{}"'.format(key, str(value).replace('\\', '\\\\').replace('"', '\\"')) for key, value in items) + '}'
+
+class Metrics:
+    """شمارنده‌ها و هیستوگرام‌های thread-safe با خروجی متنی Prometheus"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._types = {}  # name -> (type, help)
+        self._values = {}  # (name, labels) -> مقدار شمارنده یا gauge
+        self._histograms = {}  # (name, labels) -> [شمارش هر bucket..., sum, count]
+        self._collectors = []
+        self.last_tick = None
+
+    def describe(self, name, metric_type, help_text):
+        self._types[name] = (metric_type, help_text)
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._values[key] = value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [0] * (len(METRICS_BUCKETS) + 2)
+            for i, bound in enumerate(METRICS_BUCKETS):
+                if value <= bound:
+                    histogram[i] += 1
+            histogram[-2] += value
+            histogram[-1] += 1
+
+    def add_collector(self, collector):
+        """افزودن تابعی که هنگام خروجی گرفتن لیست (name, labels_dict, value) برمی‌گرداند"""
+        self._collectors.append(collector)
+
+    def render(self):
+        """خروجی متنی با فرمت Prometheus"""
+        with self._lock:
+            values = dict(self._values)
+            histograms = {key: list(histogram) for key, histogram in self._histograms.items()}
+        for collector in self._collectors:
+            for name, labels, value in collector():
+                values[(name, tuple(sorted(labels.items())))] = value
+        lines = []
+        described = set()
+        for (name, labels), value in sorted(values.items()):
+            if name not in described and name in self._types:
+                metric_type, help_text = self._types[name]
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {metric_type}")
+                described.add(name)
+            lines.append(f"{name}{_format_labels(labels)} {value}")
+        for (name, labels), histogram in sorted(histograms.items()):
+            if name not in described and name in self._types:
+                metric_type, help_text = self._types[name]
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} histogram")
+                described.add(name)
+            for i, bound in enumerate(METRICS_BUCKETS):
+                lines.append(f"{name}_bucket{_format_labels(labels, ('le', bound))} {histogram[i]}")
+            lines.append(f"{name}_bucket{_format_labels(labels, ('le', '+Inf'))} {histogram[-1]}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {histogram[-2]}")
+            lines.append(f"{name}_count{_format_labels(labels)} {histogram[-1]}")
+        return '\n'.join(lines) + '\n'
+
+metrics = Metrics()
+metrics.describe('bot_fetch_seconds', 'histogram', 'Latency of t.me page fetches per source')
+metrics.describe('bot_parse_seconds', 'histogram', 'Time spent extracting posts from a page')
+metrics.describe('bot_posts_delivered_total', 'counter', 'Posts delivered to at least one destination')
+metrics.describe('bot_filter_rejections_total', 'counter', 'Posts rejected by blacklist/whitelist')
+metrics.describe('bot_send_seconds', 'histogram', 'Latency of Bot API send calls')
+metrics.describe('bot_tick_seconds', 'histogram', 'Duration of a check tick or a single source poll')
+metrics.describe('bot_tick_overrun_total', 'counter', 'Ticks/polls that took longer than their interval or missed the tick deadline')
+metrics.describe('bot_tick_skipped_total', 'counter', 'Source checks skipped because the previous check of that source was still running')
+metrics.describe('bot_page_cache_total', 'counter', 'Page validator cache results')
+metrics.describe('bot_sends_total', 'counter', 'Send attempts by result')
+metrics.describe('bot_retry_after_total', 'counter', 'RetryAfter (HTTP 429) responses from Bot API')
+
+def start_metrics_server(host, port):
+    """اجرای سرور HTTP متریک و سلامت (Flask) در یک thread جدا از حلقه رویداد"""
+    from flask import Flask, Response, jsonify
+    from werkzeug.serving import make_server
+
+    app = Flask('bot_metrics')
+
+    @app.route('/metrics')
+    def metrics_endpoint():
+        return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+    @app.route('/healthz')
+    def health_endpoint():
+        config = load_config()
+        max_age = 2 * max(config.get('poll_max_interval', POLL_MAX_INTERVAL), CHECK_INTERVAL)
+        active = any(channel.get('is_active', True) for channel in config['channels'])
+        age = time.time() - metrics.last_tick if metrics.last_tick else None
+        healthy = not active or (age is not None and age < max_age)
+        return jsonify({'status': 'ok' if healthy else 'stale', 'last_tick_age': age}), 200 if healthy else 503
+
+    server = make_server(host, port, app, threaded=True)
+    threading.Thread(target=server.serve_forever, name='metrics-server', daemon=True).start()
+    logger.info(f"سرور متریک روی http://{host}:{port} اجرا شد.")
+    return server
 
 async def notify_admins(application, message):
-    """ارسال پیام به ادمین‌ها"""
+    """ارسال پیام به ادمین‌ها با محدودیت نرخ جداگانه (خطاهای زمان اجرا از طریق alerts خلاصه می‌شوند)"""
     config = load_config()
     if config['admin_ids']:
         for admin_id in config['admin_ids']:
+            for _ in range(2):
+                await alerts.bucket().acquire()
+                try:
+                    await application.bot.send_message(chat_id=admin_id, text=message)
+                    logger.info(f"پیام به ادمین {admin_id} ارسال شد: {message[:50]}...")
+                except RetryAfter as e:
+                    # فقط ارسال به ادمین‌ها متوقف می‌شود و صف کانال‌ها تأثیری نمی‌گیرد
+                    alerts.bucket().pause(e.retry_after)
+                    continue
+                except TelegramError as e:
+                    logger.error(f"خطا در ارسال پیام به ادمین {admin_id}: {str(e)}")
+                break
+
+class TokenBucket:
+    """سطل توکن async برای محدود کردن نرخ ارسال"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        """انتظار تا آزاد شدن یک توکن (درخواست‌ها به ترتیب ورود سرویس می‌گیرند)"""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.blocked_until:
+                    await asyncio.sleep(self.blocked_until - now)
+                    continue
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def wait_time(self):
+        """ثانیه‌های باقی‌مانده تا آزاد شدن یک توکن (0 یعنی acquire بدون انتظار انجام می‌شود)"""
+        if self._lock.locked():
+            return 1 / self.rate
+        now = time.monotonic()
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        return 0 if tokens >= 1 else (1 - tokens) / self.rate
+
+    def pause(self, seconds):
+        """توقف کامل سطل به مدت مشخص (برای RetryAfter)؛ پس از آن یک توکن بلافاصله آزاد است"""
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+        self.tokens = 1
+        self.updated = self.blocked_until
+
+# عنوان هر نوع خطا در خلاصه ارسالی به ادمین‌ها
+ALERT_KINDS = {
+    'delivery': 'ارسال به کانال مقصد',
+    'unreachable': 'دسترسی به کانال مقصد',
+    'scrape': 'اسکرپ کانال مبدأ',
+    'config': 'تنظیمات'
+}
+
+class AlertAggregator:
+    """تجمیع خطاها بر اساس (نوع، منبع) و ارسال دوره‌ای خلاصه؛ تکرار یک خطا تا تغییر وضعیت دوباره ارسال نمی‌شود"""
+
+    def __init__(self):
+        self._active = {}  # (kind, source) -> {'message', 'count', 'reported'}
+        self._recovered = []  # (kind, source) خطاهای گزارش‌شده‌ای که رفع شده‌اند
+        self._bucket = None
+
+    def bucket(self):
+        if self._bucket is None:
+            config = load_config()
+            self._bucket = TokenBucket(config.get('alert_rate', ALERT_RATE), config.get('alert_burst', ALERT_BURST))
+        return self._bucket
+
+    def report(self, kind, source, message):
+        """ثبت خطا؛ فقط اولین بار (تا رفع شدن) در خلاصه بعدی ارسال می‌شود"""
+        entry = self._active.get((kind, source))
+        if entry is None:
+            self._active[(kind, source)] = {'message': message, 'count': 1, 'reported': False}
+        else:
+            entry['message'] = message
+            entry['count'] += 1
+
+    def resolve(self, kind, source):
+        """رفع خطا؛ اگر قبلاً به ادمین‌ها گزارش شده باشد پیام رفع مشکل ارسال می‌شود"""
+        entry = self._active.pop((kind, source), None)
+        if entry is not None and entry['reported']:
+            self._recovered.append((kind, source))
+
+    def active(self):
+        return len(self._active)
+
+    def digest(self):
+        """ساخت متن خلاصه خطاهای جدید و رفع‌شده (لیست پیام‌های کوتاه‌تر از سقف تلگرام)"""
+        lines = []
+        for (kind, source), entry in self._active.items():
+            if entry['reported']:
+                continue
+            entry['reported'] = True
+            repeat = f" (×{entry['count']})" if entry['count'] > 1 else ''
+            lines.append(f"⚠️ {self._title(kind, source)}: {entry['message']}{repeat}")
+        for kind, source in self._recovered:
+            lines.append(f"✅ رفع شد: {self._title(kind, source)}")
+        self._recovered = []
+        if not lines:
+            return []
+        messages = []
+        current = f"گزارش خطاها ({len(self._active)} خطای فعال):"
+        for line in sorted(lines, key=lambda line: not line.startswith('⚠️')):
+            line = line[:ALERT_DIGEST_LIMIT - 1]
+            if len(current) + len(line) + 1 > ALERT_DIGEST_LIMIT:
+                messages.append(current)
+                current = line
+            else:
+                current = f"{current}\n{line}"
+        messages.append(current)
+        return messages
+
+    @staticmethod
+    def _title(kind, source):
+        title = ALERT_KINDS.get(kind, kind)
+        return f"{title} {source}" if source else title
+
+    async def flush(self, application):
+        """ارسال خلاصه به ادمین‌ها"""
+        for message in self.digest():
+            await notify_admins(application, message)
+
+alerts = AlertAggregator()
+metrics.describe('bot_alerts_active', 'gauge', 'Distinct (kind, source) errors currently open')
+metrics.add_collector(lambda: [('bot_alerts_active', {}, alerts.active())])
+
+DELIVERY_STATS = {'sent': 0, 'failed': 0, 'retries': 0, 'retry_after': 0}
+STARTUP_STATS = {'ready': None, 'first_delivery': None}  # ثانیه از STARTED_AT
+metrics.describe('bot_startup_seconds', 'gauge', 'Seconds from process start to ready (polling) and to the first delivery')
+metrics.add_collector(lambda: [
+    ('bot_startup_seconds', {'phase': phase}, seconds) for phase, seconds in STARTUP_STATS.items() if seconds is not None
+])
+metrics.add_collector(lambda: [
+    ('bot_sends_total', {'result': 'ok'}, DELIVERY_STATS['sent']),
+    ('bot_sends_total', {'result': 'failed'}, DELIVERY_STATS['failed']),
+    ('bot_sends_total', {'result': 'retry'}, DELIVERY_STATS['retries']),
+    ('bot_retry_after_total', {}, DELIVERY_STATS['retry_after'])
+])
+
+class DeliveryQueue:
+    """صف ارسال async با سطل توکن کلی و مخصوص هر مقصد و حفظ ترتیب پیام‌ها برای هر مقصد
+
+    هر مقصد صف جداگانه دارد و در هر لحظه حداکثر یک worker به آن ارسال می‌کند. مقصدی که سطلش
+    خالی است تا آزاد شدن توکن کنار گذاشته می‌شود تا workerها منتظر آن نمانند و بقیه مقصدها ارسال شوند.
+    """
+
+    def __init__(self):
+        self._queue = None  # مقصدهای آماده ارسال
+        self._pending = {}  # dest_channel -> deque کارهای در انتظار (به ترتیب)
+        self._workers = []
+        self._global_bucket = None
+        self._chat_buckets = {}
+
+    def _start(self):
+        config = load_config()
+        self._queue = asyncio.Queue()
+        self._pending = {}
+        self._global_bucket = TokenBucket(
+            config.get('delivery_global_rate', DELIVERY_GLOBAL_RATE),
+            config.get('delivery_global_rate', DELIVERY_GLOBAL_RATE)
+        )
+        self._workers = [
+            asyncio.create_task(self._worker())
+            for _ in range(config.get('delivery_workers', DELIVERY_WORKERS))
+        ]
+
+    def chat_bucket(self, dest_channel):
+        bucket = self._chat_buckets.get(dest_channel)
+        if bucket is None:
+            config = load_config()
+            bucket = TokenBucket(
+                config.get('delivery_chat_rate', DELIVERY_CHAT_RATE),
+                config.get('delivery_chat_burst', DELIVERY_CHAT_BURST)
+            )
+            self._chat_buckets[dest_channel] = bucket
+        return bucket
+
+    async def acquire(self, dest_channel):
+        """گرفتن توکن از سطل مقصد و سپس سطل کلی"""
+        if self._queue is None:
+            self._start()
+        await self.chat_bucket(dest_channel).acquire()
+        await self._global_bucket.acquire()
+
+    def submit(self, application, text, dest_channel, media=()):
+        """افزودن یک ارسال به صف؛ future نتیجه send_to_channel را برمی‌گرداند"""
+        if self._queue is None:
+            self._start()
+        future = asyncio.get_running_loop().create_future()
+        pending = self._pending.get(dest_channel)
+        if pending is None:
+            # مقصد بیکار است؛ به صف مقصدهای آماده اضافه می‌شود
+            self._pending[dest_channel] = deque([(application, text, media, future)])
+            self._queue.put_nowait(dest_channel)
+        else:
+            pending.append((application, text, media, future))
+        return future
+
+    async def fan_out(self, application, text, dest_channels, media=()):
+        """ارسال هم‌زمان یک پست (متن و رسانه‌ها) به همه مقصدها"""
+        futures = [self.submit(application, text, dest_channel, media) for dest_channel in dest_channels]
+        return await asyncio.gather(*futures)
+
+    def _ready(self, queue, dest_channel):
+        """برگرداندن مقصد به صف آماده (پس از آزاد شدن توکن یا پایان ارسال قبلی)"""
+        if self._queue is queue:
+            queue.put_nowait(dest_channel)
+
+    async def _worker(self):
+        queue = self._queue
+        while True:
+            dest_channel = await queue.get()
+            wait = self.chat_bucket(dest_channel).wait_time()
+            if wait > 0:
+                # محدودیت نرخ مقصد: به‌جای انتظار، worker سراغ مقصد بعدی می‌رود
+                asyncio.get_running_loop().call_later(wait, self._ready, queue, dest_channel)
+                continue
+            pending = self._pending[dest_channel]
+            application, text, media, future = pending.popleft()
             try:
-                await application.bot.send_message(chat_id=admin_id, text=message)
-                logger.info(f"پیام به ادمین {admin_id} ارسال شد: {message[:50]}...")
-            except TelegramError as e:
-                logger.error(f"خطا در ارسال پیام به ادمین {admin_id}: {str(e)}")
+                result = await send_to_channel(application, text, dest_channel, media)
+                if not future.done():
+                    future.set_result(result)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            finally:
+                # کار بعدی همین مقصد فقط پس از پایان این ارسال شروع می‌شود تا ترتیب حفظ شود
+                if pending:
+                    self._ready(queue, dest_channel)
+                elif self._pending.get(dest_channel) is pending:
+                    del self._pending[dest_channel]
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._queue = None
+        self._pending = {}
+
+delivery_queue = DeliveryQueue()
+
+class ReachabilityCache:
+    """کش TTL دسترسی به کانال‌های مقصد؛ مقصدهای غیرقابل دسترس تا موفقیت بررسی مجدد کنار گذاشته می‌شوند"""
+
+    def __init__(self):
+        self._entries = {}  # dest_channel -> (reachable, checked_at)
+        self._probing = {}  # dest_channel -> task بررسی در حال اجرا
+        self._semaphore = None
+
+    async def is_reachable(self, application, dest_channel):
+        entry = self._entries.get(dest_channel)
+        if entry is not None:
+            reachable, checked_at = entry
+            if not reachable:
+                return False
+            ttl = load_config().get('reachability_ttl', REACHABILITY_TTL)
+            if time.monotonic() - checked_at < ttl:
+                return True
+        return await self.probe(application, dest_channel)
+
+    async def probe(self, application, dest_channel):
+        """بررسی دسترسی (بررسی‌های هم‌زمان یک مقصد یکی می‌شوند)"""
+        task = self._probing.get(dest_channel)
+        if task is None:
+            task = asyncio.ensure_future(self._probe(application, dest_channel))
+            self._probing[dest_channel] = task
+            task.add_done_callback(lambda _: self._probing.pop(dest_channel, None))
+        return await asyncio.shield(task)
+
+    async def _probe(self, application, dest_channel):
+        """بررسی بی‌صدای عضویت و اجازه ارسال ربات با get_chat_member و به‌روزرسانی کش"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(load_config().get('probe_concurrency', PROBE_CONCURRENCY))
+        try:
+            async with self._semaphore:
+                member = await application.bot.get_chat_member(dest_channel, application.bot.id)
+            if member.status in (ChatMember.LEFT, ChatMember.BANNED):
+                problem = "ربات عضو این کانال نیست"
+            elif getattr(member, 'can_post_messages', None) is False or getattr(member, 'can_send_messages', None) is False:
+                problem = "ربات اجازه ارسال پیام ندارد"
+            else:
+                problem = None
+        except (BadRequest, Forbidden) as e:
+            problem = str(e)
+        except TelegramError as e:
+            # خطای موقت (شبکه یا محدودیت نرخ) باعث کنار گذاشتن مقصد نمی‌شود
+            logger.warning(f"بررسی دسترسی به {dest_channel} ناموفق بود: {str(e)}")
+            return True
+        previous = self._entries.get(dest_channel)
+        if problem:
+            self._entries[dest_channel] = (False, time.monotonic())
+            if previous is None or previous[0]:
+                logger.error(f"دسترسی به کانال مقصد {dest_channel} ممکن نیست: {problem}")
+            alerts.report('unreachable', dest_channel, problem)
+            return False
+        if previous is not None and not previous[0]:
+            logger.info(f"دسترسی به کانال مقصد {dest_channel} برقرار شد.")
+        alerts.resolve('unreachable', dest_channel)
+        self._entries[dest_channel] = (True, time.monotonic())
+        return True
 
-async def send_to_channel(application, text, dest_channel):
-    """ارسال متن به کانال مقصد"""
+    def invalidate(self, dest_channel):
+        """حذف نتیجه ذخیره‌شده تا ارسال بعدی دوباره بررسی شود"""
+        self._entries.pop(dest_channel, None)
+
+    def unreachable(self):
+        return [dest_channel for dest_channel, (reachable, _) in self._entries.items() if not reachable]
+
+    async def filter_reachable(self, application, dest_channels):
+        """برگرداندن مقصدهای قابل دسترس (بررسی‌ها هم‌زمان انجام می‌شوند)"""
+        results = await asyncio.gather(*(self.is_reachable(application, dest_channel) for dest_channel in dest_channels))
+        return [dest_channel for dest_channel, reachable in zip(dest_channels, results) if reachable]
+
+    async def reprobe(self, application):
+        """بررسی مجدد مقصدهای غیرقابل دسترس"""
+        await asyncio.gather(*(self.probe(application, dest_channel) for dest_channel in self.unreachable()))
+
+reachability = ReachabilityCache()
+
+async def bot_request(dest_channel, call, messages=1):
+    """یک درخواست Bot API به مقصد با گرفتن یک توکن برای هر پیام آن؛ فقط همین درخواست برای RetryAfter و خطاهای موقت تکرار می‌شود
+
+    ارسال یک پست ممکن است چند درخواست باشد (رسانه، سپس متن بلند)؛ تکرار کل ارسال، بخش‌های موفق را دوباره می‌فرستاد.
+    """
+    max_retries = load_config().get('delivery_max_retries', DELIVERY_MAX_RETRIES)
+    attempt = 0
+    while True:
+        for _ in range(messages):
+            await delivery_queue.acquire(dest_channel)
+        try:
+            return await call()
+        except RetryAfter as e:
+            # محدودیت flood: مقصد تا پایان زمان اعلام‌شده متوقف می‌شود و همین درخواست دوباره انجام می‌شود
+            DELIVERY_STATS['retry_after'] += 1
+            logger.warning(f"محدودیت ارسال برای {dest_channel}؛ تلاش مجدد پس از {e.retry_after} ثانیه.")
+            delivery_queue.chat_bucket(dest_channel).pause(e.retry_after)
+        except BadRequest:
+            raise
+        except (TimedOut, NetworkError) as e:
+            attempt += 1
+            if attempt > max_retries:
+                raise
+            DELIVERY_STATS['retries'] += 1
+            delay = min(2 ** (attempt - 1), DELIVERY_BACKOFF_MAX)
+            logger.warning(f"خطای موقت در ارسال به {dest_channel}: {str(e)}؛ تلاش {attempt} پس از {delay} ثانیه.")
+            await asyncio.sleep(delay)
+
+async def send_to_channel(application, text, dest_channel, media=()):
+    """ارسال متن (و رسانه‌های پست) به کانال مقصد با رعایت محدودیت نرخ، RetryAfter و تلاش مجدد برای خطاهای موقت
+
+    نتیجه برای متن شناسه پیام ارسال‌شده، برای رسانه True و در صورت شکست False است.
+    """
+    send_started = time.perf_counter()
     try:
-        await application.bot.send_message(chat_id=dest_channel, text=text, parse_mode=None)
-        logger.info(f"متن ارسال شد به {dest_channel}: {text[:50]}...")
-        return True
+        if media:
+            await send_media(application, text, dest_channel, media)
+            result = True
+        else:
+            message = await bot_request(
+                dest_channel, lambda: application.bot.send_message(chat_id=dest_channel, text=text, parse_mode=None)
+            )
+            result = message.message_id
     except TelegramError as e:
-        error_message = f"خطا در ارسال به کانال {dest_channel}: {str(e)}"
-        logger.error(error_message)
-        await notify_admins(application, error_message)
+        DELIVERY_STATS['failed'] += 1
+        reachability.invalidate(dest_channel)
+        logger.error(f"خطا در ارسال به کانال {dest_channel}: {str(e)}")
+        alerts.report('delivery', dest_channel, str(e))
         return False
+    metrics.observe('bot_send_seconds', time.perf_counter() - send_started)
+    DELIVERY_STATS['sent'] += 1
+    alerts.resolve('delivery', dest_channel)
+    if STARTUP_STATS['first_delivery'] is None:
+        STARTUP_STATS['first_delivery'] = time.monotonic() - STARTED_AT
+        logger.info(f"اولین ارسال {STARTUP_STATS['first_delivery']:.2f} ثانیه پس از شروع انجام شد.")
+    if media:
+        logger.info(f"پست با {len(media)} رسانه ارسال شد به {dest_channel}: {text[:50]}...")
+    else:
+        logger.info(f"متن ارسال شد به {dest_channel}: {text[:50]}...")
+    return result
+
+MEDIA_STATS = {'file_id': 0, 'url': 0, 'upload': 0}
+metrics.describe('bot_media_sends_total', 'counter', 'Media sends by source of the file (cached file_id, URL or streamed upload)')
+metrics.add_collector(lambda: [('bot_media_sends_total', {'via': via}, count) for via, count in MEDIA_STATS.items()])
+
+class FileIdCache:
+    """کش محدود (LRU) file_id رسانه‌های ارسال‌شده بر اساس آدرس رسانه در مبدأ تا هر رسانه فقط یک بار آپلود شود"""
+
+    def __init__(self):
+        self._entries = OrderedDict()  # media_url -> file_id
+        self._locks = {}  # media_url -> [lock, تعداد مقصدهایی که قفل را گرفته‌اند یا منتظر آن هستند]
+
+    def get(self, media_url):
+        file_id = self._entries.get(media_url)
+        if file_id is not None:
+            self._entries.move_to_end(media_url)
+        return file_id
+
+    def put(self, media_url, file_id):
+        if not file_id:
+            return
+        self._entries[media_url] = file_id
+        self._entries.move_to_end(media_url)
+        max_entries = load_config().get('file_id_cache_size', FILE_ID_CACHE_SIZE)
+        while len(self._entries) > max_entries:
+            self._entries.popitem(last=False)
+
+    def discard(self, media_url):
+        self._entries.pop(media_url, None)
+
+    def lock(self, media_url):
+        """قفل ارسال اول یک رسانه؛ بقیه مقصدها منتظر file_id آن می‌مانند"""
+        entry = self._locks.setdefault(media_url, [asyncio.Lock(), 0])
+        entry[1] += 1
+        return entry[0]
+
+    def unlock(self, media_url, lock):
+        """قفل فقط وقتی حذف می‌شود که هیچ مقصدی منتظر آن نباشد؛ وگرنه مقصد بعدی قفل تازه می‌ساخت و رسانه دوباره آپلود می‌شد"""
+        entry = self._locks.get(media_url)
+        if entry is None or entry[0] is not lock:
+            return
+        entry[1] -= 1
+        if entry[1] == 0:
+            del self._locks[media_url]
+
+file_id_cache = FileIdCache()
+
+def media_file_id(result):
+    """file_id رسانه از پاسخ Bot API (dict پیام)"""
+    for kind in ('video', 'animation', 'photo', 'document'):
+        value = result.get(kind)
+        if value:
+            # برای عکس بزرگ‌ترین اندازه آخرین عضو لیست است
+            return (value[-1] if isinstance(value, list) else value).get('file_id')
+    return None
+
+def raise_bot_api_error(status_code, payload):
+    """تبدیل پاسخ ناموفق Bot API به استثنای متناظر python-telegram-bot"""
+    description = payload.get('description') or f"HTTP {status_code}"
+    if status_code == 429:
+        raise RetryAfter((payload.get('parameters') or {}).get('retry_after', 1))
+    if status_code == 400:
+        raise BadRequest(description)
+    if status_code in (401, 403):
+        raise Forbidden(description)
+    if status_code >= 500:
+        raise NetworkError(description)
+    raise TelegramError(description)
+
+async def upload_media(application, kind, media_url, dest_channel, caption):
+    """دانلود جریانی رسانه در فایل موقت و آپلود جریانی آن به Bot API؛ file_id را برمی‌گرداند"""
+    config = load_config()
+    max_bytes = config.get('media_max_upload_bytes', MEDIA_MAX_UPLOAD_BYTES)
+    client = get_http_client()
+    with tempfile.SpooledTemporaryFile(max_size=config.get('media_spool_bytes', MEDIA_SPOOL_BYTES)) as media_file:
+        try:
+            async with client.stream('GET', media_url, timeout=MEDIA_UPLOAD_TIMEOUT) as response:
+                response.raise_for_status()
+                size = 0
+                async for chunk in response.aiter_bytes():
+                    size += len(chunk)
+                    if size > max_bytes:
+                        raise BadRequest(f"حجم رسانه {media_url} بیشتر از {max_bytes} بایت است")
+                    media_file.write(chunk)
+            media_file.seek(0)
+            filename = media_url.rsplit('/', 1)[-1].split('?')[0] or kind
+            data = {'chat_id': str(dest_channel)}
+            if caption:
+                data['caption'] = caption
+            # httpx فایل را تکه‌تکه از فایل موقت می‌خواند و کل آن در حافظه نمی‌ماند
+            response = await client.post(
+                f"{application.bot.base_url}/send{kind.capitalize()}",
+                data=data,
+                files={kind: (filename, media_file)},
+                timeout=MEDIA_UPLOAD_TIMEOUT
+            )
+        except httpx.HTTPError as e:
+            raise NetworkError(f"خطا در انتقال رسانه {media_url}: {str(e)}")
+    try:
+        payload = response.json()
+    except ValueError:
+        payload = {}
+    if not payload.get('ok'):
+        raise_bot_api_error(response.status_code, payload)
+    MEDIA_STATS['upload'] += 1
+    return media_file_id(payload['result'])
+
+async def send_single_media(application, caption, dest_channel, kind, media_url):
+    """ارسال یک رسانه: ابتدا با file_id ذخیره‌شده، سپس با آدرس (تلگرام خودش دانلود می‌کند) و در نهایت آپلود"""
+    send = getattr(application.bot, f"send_{kind}")
+    file_id = file_id_cache.get(media_url)
+    if file_id is not None:
+        try:
+            await bot_request(dest_channel, lambda: send(chat_id=dest_channel, caption=caption, **{kind: file_id}))
+            MEDIA_STATS['file_id'] += 1
+            return
+        except BadRequest as e:
+            logger.warning(f"file_id ذخیره‌شده برای {media_url} پذیرفته نشد: {str(e)}")
+            file_id_cache.discard(media_url)
+    try:
+        message = await bot_request(dest_channel, lambda: send(chat_id=dest_channel, caption=caption, **{kind: media_url}))
+        MEDIA_STATS['url'] += 1
+        file_id = media_file_id(message.to_dict())
+    except BadRequest as e:
+        logger.warning(f"تلگرام رسانه {media_url} را از آدرس دریافت نکرد؛ دانلود و آپلود: {str(e)}")
+        file_id = await bot_request(
+            dest_channel, lambda: upload_media(application, kind, media_url, dest_channel, caption)
+        )
+    file_id_cache.put(media_url, file_id)
+
+async def send_media_group(application, caption, dest_channel, media):
+    """ارسال آلبوم با file_id یا آدرس هر رسانه؛ در صورت رد شدن، رسانه‌ها تک‌تک ارسال می‌شوند"""
+    items = []
+    cached = 0
+    for index, (kind, media_url) in enumerate(media):
+        input_media = InputMediaPhoto if kind == 'photo' else InputMediaVideo
+        file_id = file_id_cache.get(media_url)
+        cached += file_id is not None
+        items.append(input_media(file_id or media_url, caption=caption if index == 0 else None))
+    try:
+        # هر عضو آلبوم یک پیام است و یک توکن می‌گیرد
+        messages = await bot_request(
+            dest_channel, lambda: application.bot.send_media_group(chat_id=dest_channel, media=items), len(items)
+        )
+    except BadRequest as e:
+        logger.warning(f"آلبوم به {dest_channel} ارسال نشد؛ ارسال تک‌تک رسانه‌ها: {str(e)}")
+        for index, (kind, media_url) in enumerate(media):
+            await send_single_media(application, caption if index == 0 else None, dest_channel, kind, media_url)
+        return
+    MEDIA_STATS['file_id'] += cached
+    MEDIA_STATS['url'] += len(messages) - cached
+    for (kind, media_url), message in zip(media, messages):
+        file_id_cache.put(media_url, media_file_id(message.to_dict()))
+
+async def send_media(application, text, dest_channel, media):
+    """ارسال رسانه‌های یک پست با متن به‌عنوان کپشن (متن بلندتر از سقف کپشن جداگانه ارسال می‌شود)"""
+    caption = text or None
+    if caption and len(caption) > MEDIA_CAPTION_LIMIT:
+        caption = None
+
+    async def send():
+        # send_single_media و send_media_group کش file_id را هنگام ارسال دوباره می‌خوانند
+        if len(media) == 1:
+            await send_single_media(application, caption, dest_channel, *media[0])
+        else:
+            await send_media_group(application, caption, dest_channel, media)
+
+    def cached():
+        return all(file_id_cache.get(media_url) is not None for _, media_url in media)
+
+    sent = False
+    if not cached():
+        # اولین مقصد رسانه را ارسال می‌کند؛ بقیه فقط تا ثبت file_id آن منتظر می‌مانند
+        key = media[0][1]
+        lock = file_id_cache.lock(key)
+        try:
+            async with lock:
+                if not cached():
+                    await send()
+                    sent = True
+        finally:
+            file_id_cache.unlock(key, lock)
+    if not sent:
+        # با file_id موجود، مقصدها هم‌زمان و بدون قفل ارسال می‌کنند
+        await send()
+    if text and caption is None:
+        await bot_request(dest_channel, lambda: application.bot.send_message(chat_id=dest_channel, text=text, parse_mode=None))
+
+# کلاینت HTTP مشترک برای استفاده مجدد از اتصال‌های keep-alive
+_http_client = None
+_fetch_semaphore = None
+
+def get_http_client():
+    """ساخت یا برگرداندن کلاینت HTTP مشترک"""
+    global _http_client
+    if _http_client is None:
+        config = load_config()
+        concurrency = config.get('fetch_concurrency', FETCH_CONCURRENCY)
+        _http_client = httpx.AsyncClient(
+            headers={'User-Agent': USER_AGENT},
+            timeout=config.get('fetch_timeout', FETCH_TIMEOUT),
+            limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency),
+            follow_redirects=True
+        )
+    return _http_client
+
+def get_fetch_semaphore():
+    """سمافور محدودکننده تعداد درخواست‌های هم‌زمان"""
+    global _fetch_semaphore
+    if _fetch_semaphore is None:
+        config = load_config()
+        _fetch_semaphore = asyncio.Semaphore(config.get('fetch_concurrency', FETCH_CONCURRENCY))
+    return _fetch_semaphore
+
+async def close_http_client():
+    """بستن کلاینت HTTP مشترک"""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+# کش اعتبارسنج صفحات (ETag / Last-Modified / اثر انگشت) برای هر کانال مبدأ
+_page_validators = {}
+PAGE_CACHE_STATS = {'hits': 0, 'misses': 0, 'not_modified': 0, 'parse_seconds': 0.0}
+metrics.add_collector(lambda: [
+    ('bot_page_cache_total', {'result': 'hit'}, PAGE_CACHE_STATS['hits']),
+    ('bot_page_cache_total', {'result': 'miss'}, PAGE_CACHE_STATS['misses']),
+    ('bot_page_cache_total', {'result': 'not_modified'}, PAGE_CACHE_STATS['not_modified'])
+])
+
+def page_fingerprint(body):
+    """اثر انگشت ارزان صفحه از روی بایت‌های متن پست‌ها و آخرین data-post بدون پارس HTML"""
+    digest = hashlib.blake2b(digest_size=16)
+    # شمارنده بازدیدها در هر درخواست تغییر می‌کند، پس فقط بخش متن پست‌ها هش می‌شود
+    pos = body.find(b'tgme_widget_message_text')
+    while pos != -1:
+        end = body.find(b'</div>', pos)
+        if end == -1:
+            end = len(body)
+        digest.update(body[pos:end])
+        pos = body.find(b'tgme_widget_message_text', end)
+    last = body.rfind(b'data-post="')
+    if last != -1:
+        digest.update(body[last:body.find(b'"', last + 11)])
+    return digest.hexdigest()
+
+def invalidate_page_cache(source_url=None):
+    """حذف اعتبارسنج‌های ذخیره‌شده یک کانال (یا همه کانال‌ها)"""
+    if source_url is None:
+        _page_validators.clear()
+    else:
+        _page_validators.pop(source_url, None)
+
+class SourceUnavailable(Exception):
+    """صفحه وب کانال مبدأ وجود ندارد یا عمومی نیست"""
+
+async def fetch_page(source_url, use_cache=True):
+    """دریافت غیرمسدودکننده صفحه کانال (بایت‌های خام)؛ اگر صفحه تغییری نکرده باشد None برمی‌گرداند"""
+    timeout = load_config().get('fetch_timeout', FETCH_TIMEOUT)
+    validators = _page_validators.get(source_url, {}) if use_cache else {}
+    headers = {}
+    if validators.get('etag'):
+        headers['If-None-Match'] = validators['etag']
+    if validators.get('last_modified'):
+        headers['If-Modified-Since'] = validators['last_modified']
+
+    async with get_fetch_semaphore():
+        fetch_started = time.perf_counter()
+        response = await asyncio.wait_for(get_http_client().get(source_url, headers=headers), timeout=timeout)
+        metrics.observe('bot_fetch_seconds', time.perf_counter() - fetch_started, source=source_url.split('?')[0])
+    if response.status_code == 304:
+        PAGE_CACHE_STATS['not_modified'] += 1
+        PAGE_CACHE_STATS['hits'] += 1
+        return None
+    response.raise_for_status()
+    if response.history and not response.url.path.startswith('/s/'):
+        # t.me/s کانال‌های خصوصی، حذف‌شده یا تغییر نام‌داده را به صفحه معمولی t.me هدایت می‌کند
+        raise SourceUnavailable(f"کانال در دسترس عمومی نیست (هدایت به {response.url})")
+    if not use_cache:
+        return response.content
+
+    fingerprint = page_fingerprint(response.content)
+    _page_validators[source_url] = {
+        'etag': response.headers.get('ETag'),
+        'last_modified': response.headers.get('Last-Modified'),
+        'fingerprint': fingerprint
+    }
+    if validators.get('fingerprint') == fingerprint:
+        PAGE_CACHE_STATS['hits'] += 1
+        return None
+    PAGE_CACHE_STATS['misses'] += 1
+    return response.content
 
-def replace_words(text, word_replacements):
-    """جایگزینی یا حذف کلمات در متن"""
-    for item in word_replacements:
-        word = item['word']
-        replacement = item['replacement']
-        text = re.sub(r'\b' + re.escape(word) + r'\b', replacement, text)
-    return text
-
-def is_blacklisted(text, blacklist):
-    """بررسی اینکه آیا متن شامل کلمات لیست سیاه است یا خیر"""
-    for word in blacklist:
-        if re.search(r'\b' + re.escape(word) + r'\b', text):
+def compile_words(words):
+    """کامپایل همه کلمات در یک الگوی واحد (کلمات بلندتر اول) یا None برای لیست خالی"""
+    words = sorted(set(words), key=len, reverse=True)
+    if not words:
+        return None
+    return re.compile(r'\b(?:' + '|'.join(re.escape(word) for word in words) + r')\b')
+
+class ChannelFilter:
+    """فیلتر کامپایل‌شده یک کانال برای جایگزینی کلمات، لیست سیاه و لیست سفید"""
+
+    def __init__(self, word_replacements, blacklist, whitelist):
+        self.replacements = {}
+        for item in word_replacements:
+            # مثل قبل، اولین تعریف هر کلمه اعمال می‌شود
+            self.replacements.setdefault(item['word'], item['replacement'])
+        self.replace_pattern = compile_words(self.replacements)
+        self.blacklist_pattern = compile_words(blacklist)
+        self.whitelist_pattern = compile_words(whitelist)
+
+    def replace_words(self, text):
+        """جایگزینی یا حذف همه کلمات در یک پیمایش متن"""
+        if self.replace_pattern is None:
+            return text
+        return self.replace_pattern.sub(lambda match: self.replacements[match.group(0)], text)
+
+    def is_blacklisted(self, text):
+        """بررسی اینکه آیا متن شامل کلمات لیست سیاه است یا خیر"""
+        return self.blacklist_pattern is not None and self.blacklist_pattern.search(text) is not None
+
+    def is_whitelisted(self, text):
+        """بررسی اینکه آیا متن شامل حداقل یکی از کلمات لیست سفید است یا خیر"""
+        if self.whitelist_pattern is None:  # اگر لیست سفید خالی باشد، نیازی به بررسی نیست
             return True
-    return False
+        return self.whitelist_pattern.search(text) is not None
 
-def is_whitelisted(text, whitelist):
-    """بررسی اینکه آیا متن شامل حداقل یکی از کلمات لیست سفید است یا خیر"""
-    if not whitelist:  # اگر لیست سفید خالی باشد، نیازی به بررسی نیست
-        return True
-    for word in whitelist:
-        if re.search(r'\b' + re.escape(word) + r'\b', text):
+# کش فیلترهای کامپایل‌شده بر اساس source_url
+_filter_cache = {}
+
+def get_channel_filter(channel_config):
+    """برگرداندن فیلتر کامپایل‌شده کانال؛ فقط در صورت تغییر لیست‌ها دوباره ساخته می‌شود"""
+    key = (
+        tuple((item['word'], item['replacement']) for item in channel_config.get('word_replacements', [])),
+        tuple(channel_config.get('blacklist', [])),
+        tuple(channel_config.get('whitelist', []))
+    )
+    cached = _filter_cache.get(channel_config['source_url'])
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    channel_filter = ChannelFilter(channel_config.get('word_replacements', []), key[1], key[2])
+    _filter_cache[channel_config['source_url']] = (key, channel_filter)
+    return channel_filter
+
+def invalidate_channel_filter(source_url):
+    """حذف فیلتر کامپایل‌شده یک کانال پس از تغییر لیست‌ها"""
+    _filter_cache.pop(source_url, None)
+
+def clean_post_text(post_text):
+    """حذف حروف عربی/فارسی و یکی کردن خطوط خالی پشت‌سرهم"""
+    # حذف حروف الفبای عربی/فارسی و اعداد عربی/فارسی
+    post_text = re.sub(r'[\u0621-\u064A\u0660-\u0669\u06F0-\u06F9\u06A9\u06CC]+', '', post_text)
+
+    lines = [line.rstrip() for line in post_text.split('\n')]
+    cleaned_lines = []
+    prev_empty = False
+    for line in lines:
+        if line.strip():
+            cleaned_lines.append(line)
+            prev_empty = False
+        elif not prev_empty:
+            cleaned_lines.append('')
+            prev_empty = True
+    return '\n'.join(cleaned_lines).strip()
+
+def clean_post_html(text_div):
+    """تبدیل HTML متن پست (گره BeautifulSoup) به متن ساده و پاک‌سازی آن"""
+    raw_text = str(text_div)
+    raw_text = re.sub(r'<a[^>]*>.*?</a>', '', raw_text)
+    raw_text = re.sub(r'<br\s*/?>\s*<br\s*/?>', '\n\n', raw_text)
+    raw_text = re.sub(r'<br\s*/?>', '\n', raw_text)
+    raw_text = re.sub(r'<[^>]+>', '', raw_text)
+    return clean_post_text(unescape(raw_text))
+
+# نشانگر موقت <br> در خروجی استخراج‌کننده
+_BR_MARK = '\x00'
+# آدرس تصویر در استایل photo_wrap صفحه وب کانال
+_BACKGROUND_URL = re.compile(r"background-image:url\('([^']+)'\)")
+
+def media_from_tag(tag, classes, attrs):
+    """تشخیص رسانه (kind, url) از تگ‌های عکس و ویدیوی ویجت پیام"""
+    if tag == 'a' and 'tgme_widget_message_photo_wrap' in classes:
+        match = _BACKGROUND_URL.search(attrs.get('style') or '')
+        if match:
+            return ('photo', match.group(1))
+    elif tag == 'video' and attrs.get('src') and (
+            'tgme_widget_message_video' in classes or 'tgme_widget_message_roundvideo' in classes):
+        return ('video', attrs['src'])
+    return None
+
+class PostExtractor(HTMLParser):
+    """استخراج‌کننده افزایشی بلوک‌های tgme_widget_message که فقط (post_id, text, media) تولید می‌کند"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.posts = []
+        self.messages_seen = 0
+        self._data_post = None
+        self._div_depth = 0  # عمق div داخل پیام جاری (0 یعنی خارج از پیام)
+        self._text_depth = 0  # عمق div داخل متن پیام
+        self._link_depth = 0
+        self._text_parts = None
+        self._media = []
+        self._document_depth = 0  # عمق div داخل عنوان فایل پیوست
+        self._document_parts = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'div':
+            classes = (dict(attrs).get('class') or '').split()
+            if not self._div_depth:
+                if 'tgme_widget_message' in classes:
+                    self.messages_seen += 1
+                    self._data_post = dict(attrs).get('data-post') or ''
+                    self._div_depth = 1
+                    self._text_parts = None
+                    self._media = []
+                return
+            self._div_depth += 1
+            if self._text_depth:
+                self._text_depth += 1
+            elif self._document_depth:
+                self._document_depth += 1
+            elif self._text_parts is None and 'tgme_widget_message_text' in classes:
+                # مثل BeautifulSoup.find فقط اولین div متن پیام استفاده می‌شود
+                self._text_depth = 1
+                self._text_parts = []
+            elif 'tgme_widget_message_document_title' in classes:
+                self._document_depth = 1
+                self._document_parts = []
+        elif self._text_depth and not self._link_depth:
+            if tag == 'br':
+                self._text_parts.append(_BR_MARK)
+            elif tag == 'a':
+                self._link_depth = 1
+        elif self._link_depth and tag == 'a':
+            self._link_depth += 1
+        elif self._div_depth and not self._text_depth and tag in ('a', 'video'):
+            attrs = dict(attrs)
+            media = media_from_tag(tag, (attrs.get('class') or '').split(), attrs)
+            if media:
+                self._media.append(media)
+
+    def handle_endtag(self, tag):
+        if not self._div_depth:
+            return
+        if tag == 'div':
+            if self._text_depth:
+                self._text_depth -= 1
+                if not self._text_depth:
+                    self._link_depth = 0
+            elif self._document_depth:
+                self._document_depth -= 1
+                if not self._document_depth:
+                    self._media.append(('document', clean_post_text(''.join(self._document_parts))))
+            self._div_depth -= 1
+            if not self._div_depth:
+                self._finish_post()
+        elif tag == 'a' and self._link_depth:
+            self._link_depth -= 1
+
+    def handle_data(self, data):
+        if self._text_depth and not self._link_depth:
+            self._text_parts.append(data)
+        elif self._document_depth:
+            self._document_parts.append(data)
+
+    def _finish_post(self):
+        post_id_match = re.search(r'/(\d+)$', self._data_post)
+        if not post_id_match:
+            return
+        post_text = None
+        if self._text_parts is not None:
+            raw_text = ''.join(self._text_parts)
+            # مثل نسخه regex: دو <br> پشت‌سرهم (با فاصله بینشان) یک خط خالی می‌شوند
+            raw_text = re.sub(_BR_MARK + r'[ \t\n\r\f\v]*' + _BR_MARK, '\n\n', raw_text)
+            post_text = clean_post_text(raw_text.replace(_BR_MARK, '\n'))
+        self.posts.append((int(post_id_match.group(1)), post_text, tuple(self._media)))
+
+def extract_posts_soup(html):
+    """استخراج لیست (post_id, text, media) با پارس کامل BeautifulSoup (مسیر جایگزین)"""
+    # bs4 فقط در مسیر جایگزین لازم است و برای سرعت راه‌اندازی دیر بارگذاری می‌شود
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, 'html.parser')
+    posts = []
+    for post in soup.find_all('div', class_='tgme_widget_message'):
+        post_id_match = re.search(r'/(\d+)$', post.get('data-post', ''))
+        if not post_id_match:
+            continue
+        text_div = post.find('div', class_='tgme_widget_message_text')
+        post_text = clean_post_html(text_div) if text_div else None
+        media = []
+        for node in post.find_all(['a', 'video', 'div']):
+            # مثل مسیر سریع، رسانه‌های داخل متن پیام نادیده گرفته می‌شوند
+            if text_div is not None and any(parent is text_div for parent in node.parents):
+                continue
+            classes = node.get('class') or []
+            if node.name == 'div':
+                if 'tgme_widget_message_document_title' in classes:
+                    media.append(('document', clean_post_text(node.get_text())))
+            else:
+                found = media_from_tag(node.name, classes, node.attrs)
+                if found:
+                    media.append(found)
+        posts.append((int(post_id_match.group(1)), post_text, tuple(media)))
+    return posts
+
+def extract_posts_fast(html):
+    """استخراج لیست (post_id, text, media) با PostExtractor؛ برای ساختار ناشناخته None برمی‌گرداند"""
+    extractor = PostExtractor()
+    try:
+        extractor.feed(html)
+        extractor.close()
+    except Exception as e:
+        logger.warning(f"خطا در استخراج‌کننده سریع: {str(e)}")
+        return None
+    # پیام بسته‌نشده یا تعداد data-post متفاوت یعنی ساختار صفحه شناخته‌شده نیست
+    if extractor._div_depth or extractor.messages_seen != html.count('data-post="'):
+        return None
+    return extractor.posts
+
+def extract_posts(html, source_url=''):
+    """استخراج لیست (post_id, text, media) از صفحه کانال (str یا بایت‌های UTF-8) به ترتیب صفحه"""
+    parse_started = time.perf_counter()
+    posts = extract_posts_worker(html)
+    parse_seconds = time.perf_counter() - parse_started
+    PAGE_CACHE_STATS['parse_seconds'] += parse_seconds
+    metrics.observe('bot_parse_seconds', parse_seconds, source=source_url)
+    return posts
+
+def extract_posts_worker(html):
+    """پارس و پاک‌سازی صفحه؛ در پردازه‌های pool هم اجرا می‌شود و فقط تاپل‌های (post_id, text, media) برمی‌گرداند"""
+    if isinstance(html, bytes):
+        html = html.decode('utf-8', errors='replace')
+    posts = extract_posts_fast(html)
+    if posts is None:
+        logger.warning("ساختار صفحه شناخته‌شده نیست؛ استفاده از BeautifulSoup.")
+        posts = extract_posts_soup(html)
+    return posts
+
+# pool پردازه‌ها برای پارس صفحات (اختیاری)
+_parse_pool = None
+_parse_pool_disabled = False
+
+def get_parse_pool():
+    """ساخت یا برگرداندن pool پارس؛ اگر parse_workers صفر باشد یا pool خراب شده باشد None"""
+    global _parse_pool
+    if _parse_pool_disabled:
+        return None
+    if _parse_pool is None:
+        workers = load_config().get('parse_workers', PARSE_WORKERS)
+        if workers <= 0:
+            return None
+        _parse_pool = ProcessPoolExecutor(max_workers=workers)
+        logger.info(f"پارس صفحات در {workers} پردازه جداگانه انجام می‌شود.")
+    return _parse_pool
+
+def shutdown_parse_pool():
+    global _parse_pool
+    if _parse_pool is not None:
+        _parse_pool.shutdown(wait=False, cancel_futures=True)
+        _parse_pool = None
+
+async def parse_page(html, source_url=''):
+    """پارس صفحه در pool پردازه‌ها (در صورت فعال بودن) با بازگشت به پارس درون‌پردازه‌ای در صورت خطا"""
+    global _parse_pool_disabled
+    pool = get_parse_pool()
+    if pool is None:
+        return extract_posts(html, source_url)
+    parse_started = time.perf_counter()
+    try:
+        posts = await asyncio.get_running_loop().run_in_executor(pool, extract_posts_worker, html)
+    except BrokenProcessPool as e:
+        logger.error(f"pool پارس از کار افتاد؛ پارس در همین پردازه ادامه می‌یابد: {str(e)}")
+        _parse_pool_disabled = True
+        shutdown_parse_pool()
+        return extract_posts(html, source_url)
+    except Exception as e:
+        logger.warning(f"خطا در پارس {source_url} در pool؛ پارس در همین پردازه: {str(e)}")
+        return extract_posts(html, source_url)
+    parse_seconds = time.perf_counter() - parse_started
+    PAGE_CACHE_STATS['parse_seconds'] += parse_seconds
+    metrics.observe('bot_parse_seconds', parse_seconds, source=source_url)
+    return posts
+
+async def collect_new_posts(source_url, posts, last_post_id, max_posts):
+    """جمع‌آوری همه پست‌های جدیدتر از last_post_id از پست‌های صفحه اول با صفحه‌زنی رو به عقب (?before=)"""
+    if not posts:
+        return []
+    if last_post_id is None:
+        # اولین اجرا برای این کانال: فقط آخرین پست
+        return posts[-1:]
+
+    new_posts = [post for post in posts if post[0] > last_post_id]
+    oldest_id = posts[0][0]
+    while new_posts and oldest_id > last_post_id + 1 and len(new_posts) < max_posts:
+        older_html = await fetch_page(f"{source_url}?before={oldest_id}", use_cache=False)
+        older_posts = await parse_page(older_html, source_url)
+        older_posts = [post for post in older_posts if last_post_id < post[0] < oldest_id]
+        if not older_posts:
+            break
+        new_posts = older_posts + new_posts
+        oldest_id = older_posts[0][0]
+
+    if len(new_posts) > max_posts:
+        logger.warning(f"{len(new_posts)} پست عقب‌افتاده در {source_url}؛ فقط {max_posts} پست آخر ارسال می‌شود.")
+        new_posts = new_posts[-max_posts:]
+    return new_posts
+
+def post_link(source_url, post_id):
+    """پیوند عمومی پست (https://t.me/channel/123) از آدرس صفحه وب کانال"""
+    return f"{source_url.rstrip('/').replace('/s/', '/', 1)}/{post_id}"
+
+class CircuitBreaker:
+    """قطع‌کننده مدار هر کانال مبدأ: closed (عادی)، open (توقف بررسی با backoff نمایی) و half-open (یک بررسی آزمایشی)"""
+
+    CLOSED, HALF_OPEN, OPEN = 'closed', 'half_open', 'open'
+
+    def __init__(self):
+        self._entries = {}  # source_url -> وضعیت کانال‌هایی که خطای اخیر داشته‌اند
+        self._paused = None  # source_url -> {'reason', 'paused_at'} (از state_store، بین پردازه‌ها مشترک)
+
+    def paused(self):
+        if self._paused is None:
+            self._paused = state_store.list_meta('paused')
+        return self._paused
+
+    def allow(self, source_url):
+        """آیا بررسی کانال اکنون مجاز است؛ پس از پایان توقف مدار نیمه‌باز می‌شود"""
+        if source_url in self.paused():
+            # ممکن است با /startchannel در پردازه دیگری از توقف خارج شده باشد
+            if state_store.get_meta('paused', source_url) is not None:
+                return False
+            self._paused.pop(source_url, None)
+            self._entries.pop(source_url, None)
+        entry = self._entries.get(source_url)
+        if entry is None or entry['state'] != self.OPEN:
             return True
-    return False
+        if time.monotonic() < entry['open_until']:
+            return False
+        entry['state'] = self.HALF_OPEN
+        return True
 
-def scrape_channel(source_url):
-    """اسکرپ کردن صفحه وب کانال با جایگزینی کلمات و بررسی لیست سیاه و سفید"""
-    last_post_ids = load_last_post_ids()
-    last_post_id = last_post_ids.get(source_url)
+    def retry_in(self, source_url):
+        """ثانیه‌های باقی‌مانده تا بررسی بعدی مجاز (برای زمان‌بندی)، یا None اگر مدار بسته است"""
+        if source_url in self.paused():
+            return load_config().get('poll_max_interval', POLL_MAX_INTERVAL)
+        entry = self._entries.get(source_url)
+        if entry is None or entry['state'] != self.OPEN:
+            return None
+        return max(0, entry['open_until'] - time.monotonic())
+
+    def record_success(self, source_url):
+        entry = self._entries.pop(source_url, None)
+        if entry is not None and entry['opens']:
+            logger.info(f"دریافت صفحه {source_url} پس از {entry['failures']} خطای پیاپی دوباره برقرار شد.")
+
+    def record_failure(self, source_url, reason, retry_after=0, dead=False):
+        """ثبت خطای دریافت صفحه؛ فقط خطاهای مخصوص همین کانال (dead) به توقف خودکار می‌رسند
+
+        خطای شبکه، پایان مهلت، 429 و 5xx ممکن است از قطعی کل شبکه یا t.me باشند؛ این خطاها فقط
+        backoff دارند تا همه کانال‌ها با یک قطعی طولانی متوقف نشوند.
+        """
+        config = load_config()
+        entry = self._entries.setdefault(
+            source_url, {'state': self.CLOSED, 'failures': 0, 'dead_failures': 0, 'opens': 0, 'open_until': 0, 'reason': ''}
+        )
+        entry['failures'] += 1
+        if dead:
+            entry['dead_failures'] += 1
+        entry['reason'] = reason
+        if entry['dead_failures'] >= config.get('breaker_pause_failures', BREAKER_PAUSE_FAILURES):
+            self.pause(source_url, reason)
+            return
+        threshold = config.get('breaker_failure_threshold', BREAKER_FAILURE_THRESHOLD)
+        if entry['state'] == self.HALF_OPEN or entry['failures'] >= threshold:
+            entry['opens'] += 1
+            delay = min(
+                config.get('breaker_backoff_base', BREAKER_BACKOFF_BASE) * 2 ** (entry['opens'] - 1),
+                config.get('breaker_backoff_max', BREAKER_BACKOFF_MAX)
+            )
+            delay = max(delay, retry_after)
+            entry['state'] = self.OPEN
+            entry['open_until'] = time.monotonic() + delay
+            logger.warning(f"بررسی {source_url} پس از {entry['failures']} خطای پیاپی به مدت {delay:.0f} ثانیه متوقف شد: {reason}")
+
+    def pause(self, source_url, reason):
+        """توقف خودکار کانالی که مدت طولانی در دسترس نبوده است (تا /startchannel)"""
+        self._entries.pop(source_url, None)
+        self.paused()[source_url] = {'reason': reason, 'paused_at': time.time()}
+        state_store.set_meta('paused', source_url, self._paused[source_url])
+        state_store.commit()
+        logger.error(f"کانال {source_url} به دلیل خطاهای پیاپی به‌طور خودکار متوقف شد: {reason}")
+        alerts.report('scrape', source_url, f"به‌طور خودکار متوقف شد (برای شروع دوباره /startchannel): {reason}")
+
+    def reset(self, source_url):
+        """بستن مدار و خروج از توقف خودکار (همراه با commit بعدی ثبت می‌شود)"""
+        self._entries.pop(source_url, None)
+        if source_url in self.paused():
+            self._paused.pop(source_url)
+            state_store.delete_meta('paused', source_url)
+
+    def describe(self, source_url):
+        """توضیح وضعیت برای /getconfig یا None اگر کانال سالم است"""
+        paused = self.paused().get(source_url)
+        if paused is not None:
+            return f"متوقف خودکار ({paused['reason']})"
+        entry = self._entries.get(source_url)
+        if entry is None:
+            return None
+        if entry['state'] == self.OPEN:
+            return f"قطع موقت تا {self.retry_in(source_url):.0f} ثانیه دیگر پس از {entry['failures']} خطا ({entry['reason']})"
+        return f"{entry['failures']} خطای پیاپی ({entry['reason']})"
+
+    def collect(self):
+        """متریک وضعیت مدار (0 بسته، 1 نیمه‌باز، 2 باز، 3 متوقف خودکار) فقط برای کانال‌های دارای خطا"""
+        states = {self.CLOSED: 0, self.HALF_OPEN: 1, self.OPEN: 2}
+        samples = [
+            ('bot_source_breaker_state', {'source': source_url}, states[entry['state']])
+            for source_url, entry in list(self._entries.items())
+        ]
+        samples += [('bot_source_breaker_state', {'source': source_url}, 3) for source_url in list(self._paused or ())]
+        return samples
+
+circuit_breaker = CircuitBreaker()
+metrics.describe('bot_source_breaker_state', 'gauge', 'Per-source circuit breaker state (0 closed, 1 half-open, 2 open, 3 auto-paused)')
+metrics.add_collector(circuit_breaker.collect)
+
+def post_hash(text):
+    """هش کوتاه متن (متن خام مبدأ برای تشخیص ویرایش و متن ارسال‌شده برای انتخاب پیام‌هایی که باید ویرایش شوند)"""
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest()
+
+def render_post(source_url, post_id, post_text, media, channel_filter):
+    """آماده‌سازی متن و رسانه‌های پست برای ارسال؛ (متن، رسانه‌ها، دلیل رد یا None)"""
+    # فایل‌های پیوست در صفحه وب آدرس دانلود ندارند؛ عنوان و پیوند پست به متن اضافه می‌شود
+    documents = [title for kind, title in media if kind == 'document']
+    media = tuple(item for item in media if item[0] != 'document')
+    if not post_text and not media and not documents:
+        return '', media, 'empty'
+    # اعمال جایگزینی کلمات
+    post_text = channel_filter.replace_words(post_text or '')
+    # بررسی لیست سیاه و سفید
+    if channel_filter.is_blacklisted(post_text):
+        return post_text, media, 'blacklist'
+    if not channel_filter.is_whitelisted(post_text):
+        return post_text, media, 'whitelist'
+    if documents:
+        notices = [f"📎 {title}" for title in documents if title]
+        notices.append(post_link(source_url, post_id))
+        post_text = '\n\n'.join(part for part in [post_text, '\n'.join(notices)] if part)
+    return post_text, media, None
+
+def find_changed_posts(source_url, page_posts, channel_filter, propagate_deletes):
+    """مقایسه پست‌های صفحه با شاخص پیام‌های ارسال‌شده
+
+    نتیجه لیست (post_id، متن جدید یا None برای حذف، همه پیام‌های پست، هش جدید مبدأ، هش قبلی مبدأ) است.
+    """
+    index = state_store.get_message_index(source_url)
+    if not index or not page_posts:
+        return []
+    changes = []
+    for post_id, post_text, media in page_posts:
+        entry = index.get(post_id)
+        if entry is None:
+            continue
+        previous_hash, messages = entry
+        # ویرایش از روی متن خام مبدأ تشخیص داده می‌شود؛ تغییر جایگزینی کلمات نباید پست‌های قدیمی را ویرایش‌شده نشان دهد
+        source_hash = post_hash(post_text or '')
+        if source_hash == previous_hash:
+            continue
+        post_text, media, rejected = render_post(source_url, post_id, post_text, media, channel_filter)
+        if rejected is None and not media:
+            changes.append((post_id, post_text, messages, source_hash, previous_hash))
+    if propagate_deletes:
+        # فقط پست‌هایی که در بازه این صفحه هستند ولی دیگر نمایش داده نمی‌شوند حذف شده‌اند
+        page_ids = {post[0] for post in page_posts}
+        oldest_id = page_posts[0][0]
+        changes.extend(
+            (post_id, None, messages, None, previous_hash) for post_id, (previous_hash, messages) in sorted(index.items())
+            if post_id >= oldest_id and post_id not in page_ids
+        )
+    return changes
+
+async def scrape_channel(source_url):
+    """اسکرپ کردن صفحه وب کانال و برگرداندن همه پست‌های جدید (به ترتیب) پس از جایگزینی کلمات و بررسی لیست سیاه و سفید
+
+    نتیجه (پست‌های جدید، تغییرات) است؛ تغییرات پست‌های ارسال‌شده‌ای هستند که در مبدأ ویرایش یا حذف شده‌اند.
+    """
+    last_post_id = state_store.get_cursor(source_url)
     config = load_config()
-    
+
     # پیدا کردن کانال مربوطه
-    channel_config = next((ch for ch in config['channels'] if ch['source_url'] == source_url), None)
+    channel_config = config_store.get_channel(source_url)
     if not channel_config:
         logger.error(f"کانال {source_url} در تنظیمات پیدا نشد.")
-        return None
-    
+        return [], []
+
     # بررسی وضعیت is_active
     if not channel_config.get('is_active', True):
         logger.info(f"کپی برای کانال {source_url} غیرفعال است.")
-        return None
-
-    word_replacements = channel_config.get('word_replacements', [])
-    blacklist = channel_config.get('blacklist', [])
-    whitelist = channel_config.get('whitelist', [])
+        return [], []
 
-    try:
-        headers = {'User-Agent': USER_AGENT}
-        response = requests.get(source_url, headers=headers, timeout=15)
-        response.raise_for_status()
-
-        soup = BeautifulSoup(response.text, 'html.parser')
-        posts = soup.find_all('div', class_='tgme_widget_message')
+    # کانال‌هایی که پیاپی خطا داده‌اند تا پایان backoff بررسی نمی‌شوند
+    if not circuit_breaker.allow(source_url):
+        return [], []
 
-        if not posts:
-            logger.info(f"هیچ پستی در {source_url} پیدا نشد.")
-            return None
+    channel_filter = get_channel_filter(channel_config)
+    max_posts = config.get('catchup_max_posts', CATCHUP_MAX_POSTS)
 
-        latest_post = posts[-1]
-        post_data_attr = latest_post.get('data-post', '')
-        if not post_data_attr:
-            logger.warning(f"data-post در {source_url} پیدا نشد.")
-            return None
+    try:
+        html = await fetch_page(source_url)
+        # اگر صفحه تغییری نکرده باشد (None) پارس، پاک‌سازی متن و بررسی ویرایش‌ها لازم نیست
+        page_posts = await parse_page(html, source_url) if html is not None else []
+        posts = await collect_new_posts(source_url, page_posts, last_post_id, max_posts)
+        changes = []
+        if config.get('propagate_edits', True):
+            changes = find_changed_posts(source_url, page_posts, channel_filter, config.get('propagate_deletes', False))
+
+        new_posts = []
+        for post_id, post_text, media in posts:
+            source_hash = post_hash(post_text or '')
+            post_text, media, rejected = render_post(source_url, post_id, post_text, media, channel_filter)
+            if rejected == 'empty':
+                continue
 
-        post_id_match = re.search(r'/(\d+)$', post_data_attr)
-        post_id = post_id_match.group(1) if post_id_match else None
-
-        text_div = latest_post.find('div', class_='tgme_widget_message_text')
-        if text_div:
-            raw_text = str(text_div)
-            raw_text = re.sub(r'<a[^>]*>.*?</a>', '', raw_text)
-            raw_text = re.sub(r'<br\s*/?>\s*<br\s*/?>', '\n\n', raw_text)
-            raw_text = re.sub(r'<br\s*/?>', '\n', raw_text)
-            from html import unescape
-            raw_text = re.sub(r'<[^>]+>', '', raw_text)
-            post_text = unescape(raw_text)
-            
-            # حذف حروف الفبای عربی/فارسی و اعداد عربی/فارسی
-            post_text = re.sub(r'[\u0621-\u064A\u0660-\u0669\u06F0-\u06F9\u06A9\u06CC]+', '', post_text)
-            
-            lines = [line.rstrip() for line in post_text.split('\n')]
-            cleaned_lines = []
-            prev_empty = False
-            for line in lines:
-                if line.strip():
-                    cleaned_lines.append(line)
-                    prev_empty = False
-                elif not prev_empty:
-                    cleaned_lines.append('')
-                    prev_empty = True
-            post_text = '\n'.join(cleaned_lines).strip()
-            # اعمال جایگزینی کلمات
-            post_text = replace_words(post_text, word_replacements)
-
-            # بررسی لیست سیاه
-            if is_blacklisted(post_text, blacklist):
+            if rejected == 'blacklist':
+                metrics.inc('bot_filter_rejections_total', source=source_url, reason='blacklist')
                 logger.info(f"پست در {source_url} به دلیل وجود کلمه در لیست سیاه ارسال نشد: {post_text[:50]}...")
-                return None
+                continue
 
-            # بررسی لیست سفید
-            if not is_whitelisted(post_text, whitelist):
+            if rejected == 'whitelist':
+                metrics.inc('bot_filter_rejections_total', source=source_url, reason='whitelist')
                 logger.info(f"پست در {source_url} به دلیل عدم وجود کلمه در لیست سفید ارسال نشد: {post_text[:50]}...")
-                return None
-
-        else:
-            post_text = None
-
-        if post_text and post_id and post_id != last_post_id:
-            save_last_post_id(source_url, post_id)
-            logger.info(f"پست جدید در {source_url}: ID {post_id}, متن: {post_text[:50]}...")
-            return post_text
-        return None
+                continue
 
-    except requests.exceptions.RequestException as e:
+            logger.info(f"پست جدید در {source_url}: ID {post_id}, رسانه: {len(media)}, متن: {post_text[:50]}...")
+            # ثبت در outbox در همان تراکنش cursor؛ پستی که cursor از آن گذشته تا ارسال به همه مقصدها باقی می‌ماند
+            pending = state_store.outbox_add(source_url, post_id, post_text, media, channel_config['dest_channels'])
+            OUTBOX_STATS['journaled'] += len(pending)
+            if pending:
+                new_posts.append({
+                    'post_id': post_id, 'text': post_text, 'media': media, 'pending': pending, 'source_hash': source_hash
+                })
+
+        if posts and posts[-1][0] != last_post_id:
+            state_store.set_cursor(source_url, posts[-1][0])
+
+    # fetch_page اعتبارسنج‌ها را پیش از پارس و ثبت پست‌ها ذخیره می‌کند؛ پس از هر خطا باید پاک شوند
+    # وگرنه صفحه در بررسی بعدی «بدون تغییر» دیده می‌شود و پست‌های آن دیگر بررسی نمی‌شوند
+    except httpx.HTTPStatusError as e:
+        status_code = e.response.status_code
         logger.error(f"خطا در درخواست HTTP برای {source_url}: {str(e)}")
-        return None
+        alerts.report('scrape', source_url, f"HTTP {status_code}")
+        retry_after = e.response.headers.get('Retry-After', '')
+        circuit_breaker.record_failure(
+            source_url, f"HTTP {status_code}",
+            retry_after=int(retry_after) if retry_after.isdigit() else 0, dead=status_code in (404, 410)
+        )
+        invalidate_page_cache(source_url)
+        return [], []
+    except httpx.HTTPError as e:
+        logger.error(f"خطا در درخواست HTTP برای {source_url}: {str(e)}")
+        alerts.report('scrape', source_url, str(e) or type(e).__name__)
+        circuit_breaker.record_failure(source_url, str(e) or type(e).__name__)
+        invalidate_page_cache(source_url)
+        return [], []
+    except asyncio.TimeoutError:
+        logger.error(f"مهلت درخواست HTTP برای {source_url} به پایان رسید.")
+        alerts.report('scrape', source_url, "مهلت درخواست به پایان رسید")
+        circuit_breaker.record_failure(source_url, "مهلت درخواست به پایان رسید")
+        invalidate_page_cache(source_url)
+        return [], []
+    except SourceUnavailable as e:
+        logger.error(f"کانال {source_url} در دسترس نیست: {str(e)}")
+        alerts.report('scrape', source_url, str(e))
+        circuit_breaker.record_failure(source_url, str(e), dead=True)
+        invalidate_page_cache(source_url)
+        return [], []
     except Exception as e:
         logger.error(f"خطا در اسکرپینگ {source_url}: {str(e)}")
-        return None
+        alerts.report('scrape', source_url, str(e))
+        invalidate_page_cache(source_url)
+        return [], []
+    alerts.resolve('scrape', source_url)
+    circuit_breaker.record_success(source_url)
+    return new_posts, changes
+
+def batch_summary(done, done_template, skipped=(), skipped_template=''):
+    """پاسخ دستورات چندآرگومانی: یک خط برای موارد انجام‌شده و یک خط برای موارد ردشده ({} جای لیست)"""
+    lines = []
+    if done:
+        lines.append(done_template.replace('{}', ', '.join(done), 1))
+    if skipped:
+        lines.append(skipped_template.replace('{}', ', '.join(skipped), 1))
+    return '\n'.join(lines)
+
+# فیلدهای هر کانال در فایل‌های /import و /export
+CHANNEL_FIELDS = ('source_url', 'dest_channels', 'is_active', 'word_replacements', 'blacklist', 'whitelist', 'digest_window')
+
+def channels_to_csv(channels):
+    """تبدیل لیست کانال‌ها به CSV (اعضای لیست‌ها با CSV_LIST_SEPARATOR و جایگزینی‌ها به شکل word=replacement)"""
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(CHANNEL_FIELDS)
+    for channel in channels:
+        writer.writerow([
+            channel['source_url'],
+            CSV_LIST_SEPARATOR.join(channel['dest_channels']),
+            'true' if channel.get('is_active', True) else 'false',
+            CSV_LIST_SEPARATOR.join(f"{item['word']}={item['replacement']}" for item in channel['word_replacements']),
+            CSV_LIST_SEPARATOR.join(channel['blacklist']),
+            CSV_LIST_SEPARATOR.join(channel['whitelist']),
+            channel.get('digest_window', 0)
+        ])
+    return output.getvalue()
+
+def parse_channels_document(data, filename=''):
+    """خواندن لیست کانال‌ها از JSON (لیست یا {"channels": [...]}) یا CSV با همان ستون‌های /export"""
+    text = data.decode('utf-8-sig') if isinstance(data, bytes) else data
+    if filename.lower().endswith('.json') or text.lstrip().startswith(('{', '[')):
+        document = json.loads(text)
+        return document.get('channels') if isinstance(document, dict) else document
+
+    def split_list(value):
+        return [item.strip() for item in value.split(CSV_LIST_SEPARATOR) if item.strip()]
+
+    items = []
+    for row in csv.DictReader(io.StringIO(text.strip())):
+        # ستون‌های خالی یا ناموجود در حالت merge مقدار فعلی را تغییر نمی‌دهند
+        item = {key: value for key, value in row.items() if key and value is not None and value.strip() != ''}
+        if 'dest_channels' in item:
+            item['dest_channels'] = split_list(item['dest_channels'])
+        if 'is_active' in item:
+            flag = item['is_active'].strip().lower()
+            item['is_active'] = {'true': True, '1': True, 'yes': True, 'false': False, '0': False, 'no': False}.get(flag, flag)
+        if 'word_replacements' in item:
+            item['word_replacements'] = [
+                dict(zip(('word', 'replacement'), pair.split('=', 1))) if '=' in pair else {'word': pair, 'replacement': ''}
+                for pair in split_list(item['word_replacements'])
+            ]
+        for key in ('blacklist', 'whitelist'):
+            if key in item:
+                item[key] = split_list(item[key])
+        if 'digest_window' in item:
+            try:
+                item['digest_window'] = int(item['digest_window'])
+            except ValueError:
+                pass
+        items.append(item)
+    return items
+
+def validate_channels(items, existing_urls):
+    """بررسی کانال‌های ورودی قبل از اعمال؛ (کانال‌های نرمال‌شده، لیست خطاها)"""
+    if not isinstance(items, list):
+        return [], ['ساختار فایل باید لیست کانال‌ها یا {"channels": [...]} باشد.']
+
+    def is_word_list(value):
+        return isinstance(value, list) and all(isinstance(word, str) and word for word in value)
+
+    channels, errors, seen = [], [], set()
+    for index, item in enumerate(items, 1):
+        if not isinstance(item, dict):
+            errors.append(f"ردیف {index}: هر کانال باید یک شیء باشد.")
+            continue
+        source_url = item.get('source_url')
+        if not isinstance(source_url, str) or not source_url.startswith('https://t.me/s/'):
+            errors.append(f"ردیف {index}: source_url نامعتبر است. باید با https://t.me/s/ شروع شود.")
+            continue
+        prefix = f"ردیف {index} ({source_url})"
+        if source_url in seen:
+            errors.append(f"{prefix}: کانال تکراری است.")
+            continue
+        seen.add(source_url)
+        unknown = set(item) - set(CHANNEL_FIELDS)
+        if unknown:
+            errors.append(f"{prefix}: فیلد ناشناخته {', '.join(sorted(unknown))}.")
+        channel = {'source_url': source_url}
+        if 'dest_channels' in item:
+            if not is_word_list(item['dest_channels']) or not item['dest_channels']:
+                errors.append(f"{prefix}: dest_channels باید لیست غیرخالی از کانال‌های مقصد باشد.")
+            else:
+                channel['dest_channels'] = list(dict.fromkeys(item['dest_channels']))
+        elif source_url not in existing_urls:
+            errors.append(f"{prefix}: کانال جدید باید حداقل یک کانال مقصد داشته باشد.")
+        if 'is_active' in item:
+            if not isinstance(item['is_active'], bool):
+                errors.append(f"{prefix}: is_active باید true یا false باشد.")
+            else:
+                channel['is_active'] = item['is_active']
+        if 'word_replacements' in item:
+            replacements = item['word_replacements']
+            if not isinstance(replacements, list) or not all(
+                    isinstance(entry, dict) and isinstance(entry.get('word'), str) and entry['word']
+                    and isinstance(entry.get('replacement', ''), str) for entry in replacements):
+                errors.append(f"{prefix}: word_replacements باید لیست {{\"word\", \"replacement\"}} باشد.")
+            else:
+                unique = {entry['word']: entry.get('replacement', '') for entry in replacements}
+                channel['word_replacements'] = [{'word': word, 'replacement': replacement} for word, replacement in unique.items()]
+        for key in ('blacklist', 'whitelist'):
+            if key in item:
+                if not is_word_list(item[key]):
+                    errors.append(f"{prefix}: {key} باید لیست کلمات باشد.")
+                else:
+                    channel[key] = list(dict.fromkeys(item[key]))
+        if 'digest_window' in item:
+            window = item['digest_window']
+            if isinstance(window, bool) or not isinstance(window, int) or window < 0:
+                errors.append(f"{prefix}: digest_window باید عدد صحیح نامنفی (ثانیه) باشد.")
+            else:
+                channel['digest_window'] = window
+        channels.append(channel)
+    return channels, errors
+
+def apply_channels(config, channels, replace=False):
+    """اعمال یکجای کانال‌های معتبر روی تنظیمات در حافظه؛ (افزوده‌شده‌ها، به‌روزشده‌ها، حذف‌شده‌ها)"""
+    current = {channel['source_url']: channel for channel in config['channels']}
+    added, updated = [], []
+    new_channels = [] if replace else list(config['channels'])
+    for channel in channels:
+        target = current.get(channel['source_url'])
+        if target is None or replace:
+            target = {
+                'source_url': channel['source_url'],
+                'dest_channels': [],
+                'is_active': True,
+                'word_replacements': [],
+                'blacklist': [],
+                'whitelist': []
+            }
+            new_channels.append(target)
+        (updated if channel['source_url'] in current else added).append(channel['source_url'])
+        target.update(channel)
+    imported = {channel['source_url'] for channel in channels}
+    removed = [url for url in current if url not in imported] if replace else []
+    config['channels'] = new_channels
+    return added, updated, removed
 
 async def start(update, context):
     """نمایش پیام خوش‌آمدگویی و لیست دستورات"""
@@ -215,21 +1989,26 @@ async def start(update, context):
         "به ربات خوش آمدید! 😊\n"
         "دستورات موجود:\n"
         "/start - نمایش این پیام\n"
-        "/addsource <URL> <dest_channel> - افزودن کانال مبدأ و مقصد\n"
+        "/addsource <URL> <dest_channel> [dest_channel ...] - افزودن کانال مبدأ و مقصدها\n"
         "/removesource <URL> - حذف کانال مبدأ\n"
-        "/adddestination <source_url> <dest_channel> - افزودن کانال مقصد به مبدأ\n"
-        "/removedestination <source_url> <dest_channel> - حذف کانال مقصد از مبدأ\n"
+        "/adddestination <source_url> <dest_channel> [dest_channel ...] - افزودن کانال‌های مقصد به مبدأ\n"
+        "/removedestination <source_url> <dest_channel> [dest_channel ...] - حذف کانال‌های مقصد از مبدأ\n"
         "/addword <source_url> <word> <replacement> - افزودن کلمه برای جایگزینی یا حذف در کانال\n"
-        "/removeword <source_url> <word> - حذف کلمه از لیست جایگزینی کانال\n"
-        "/addblack <source_url> <word> - افزودن کلمه به لیست سیاه کانال\n"
-        "/removeblack <source_url> <word> - حذف کلمه از لیست سیاه کانال\n"
-        "/addwhite <source_url> <word> - افزودن کلمه به لیست سفید کانال\n"
-        "/removewhite <source_url> <word> - حذف کلمه از لیست سفید کانال\n"
+        "/addword <source_url> <word>=<replacement> [<word>= ...] - افزودن چند کلمه (بدون جایگزین یعنی حذف)\n"
+        "/removeword <source_url> <word> [word ...] - حذف کلمات از لیست جایگزینی کانال\n"
+        "/addblack <source_url> <word> [word ...] - افزودن کلمات به لیست سیاه کانال\n"
+        "/removeblack <source_url> <word> [word ...] - حذف کلمات از لیست سیاه کانال\n"
+        "/addwhite <source_url> <word> [word ...] - افزودن کلمات به لیست سفید کانال\n"
+        "/removewhite <source_url> <word> [word ...] - حذف کلمات از لیست سفید کانال\n"
+        "/import [merge|replace] - وارد کردن کانال‌ها از فایل JSON/CSV (در پاسخ به فایل یا کپشن آن)\n"
+        "/export [json|csv] - دریافت فایل تنظیمات کانال‌ها\n"
         "/stopall - توقف کپی از همه کانال‌ها\n"
         "/startall - شروع کپی از همه کانال‌ها\n"
         "/stop <source_url> - توقف کپی از یک کانال خاص\n"
         "/startchannel <source_url> - شروع کپی از یک کانال خاص\n"
+        "/digest <source_url> <seconds> - تجمیع پست‌های متنی هر چند ثانیه در یک پیام (0 یعنی خاموش)\n"
         "/getconfig - نمایش تنظیمات فعلی\n"
+        "/stats - نمایش آمار کش صفحات و ارسال\n"
     )
     await update.message.reply_text(help_text)
 
@@ -244,24 +2023,24 @@ async def add_source(update, context):
             await update.message.reply_text("لطفاً URL کانال مبدأ و حداقل یک کانال مقصد را وارد کنید. مثال:\n/addsource https://t.me/s/channel @destination")
             return
         source_url = args[0]
-        dest_channel = args[1]
+        dest_channels = list(dict.fromkeys(args[1:]))
         if not source_url.startswith('https://t.me/s/'):
             await update.message.reply_text("URL نامعتبر است. باید با https://t.me/s/ شروع شود.")
             return
-        for channel in config['channels']:
-            if channel['source_url'] == source_url:
-                await update.message.reply_text(f"کانال مبدأ {source_url} قبلاً اضافه شده است.")
-                return
+        if config_store.get_channel(source_url) is not None:
+            await update.message.reply_text(f"کانال مبدأ {source_url} قبلاً اضافه شده است.")
+            return
         config['channels'].append({
             'source_url': source_url,
-            'dest_channels': [dest_channel],
+            'dest_channels': dest_channels,
             'is_active': True,
             'word_replacements': [],
             'blacklist': [],
             'whitelist': []
         })
         save_config(config)
-        await update.message.reply_text(f"کانال مبدأ {source_url} با مقصد {dest_channel} اضافه شد.")
+        source_scheduler.schedule(source_url, delay=0)
+        await update.message.reply_text(f"کانال مبدأ {source_url} با مقصد {', '.join(dest_channels)} اضافه شد.")
     else:
         await update.message.reply_text("شما اجازه تغییر تنظیمات را ندارید.")
 
@@ -278,11 +2057,12 @@ async def remove_source(update, context):
         source_url = args[0]
         config['channels'] = [ch for ch in config['channels'] if ch['source_url'] != source_url]
         save_config(config)
-        last_post_ids = load_last_post_ids()
-        if source_url in last_post_ids:
-            del last_post_ids[source_url]
-            with open(STATE_FILE, 'w') as f:
-                json.dump(last_post_ids, f)
+        source_scheduler.cancel(source_url)
+        invalidate_channel_filter(source_url)
+        state_store.delete_cursor(source_url)
+        state_store.delete_message_index(source_url)
+        circuit_breaker.reset(source_url)
+        state_store.commit()
         await update.message.reply_text(f"کانال مبدأ {source_url} حذف شد.")
     else:
         await update.message.reply_text("شما اجازه تغییر تنظیمات را ندارید.")
@@ -298,17 +2078,23 @@ async def add_destination(update, context):
             await update.message.reply_text("لطفاً URL کانال مبدأ و کانال مقصد را وارد کنید. مثال:\n/adddestination https://t.me/s/channel @destination")
             return
         source_url = args[0]
-        dest_channel = args[1]
-        for channel in config['channels']:
-            if channel['source_url'] == source_url:
-                if dest_channel not in channel['dest_channels']:
-                    channel['dest_channels'].append(dest_channel)
-                    save_config(config)
-                    await update.message.reply_text(f"کانال مقصد {dest_channel} به {source_url} اضافه شد.")
-                else:
-                    await update.message.reply_text(f"کانال مقصد {dest_channel} قبلاً برای {source_url} وجود دارد.")
-                return
-        await update.message.reply_text(f"کانال مبدأ {source_url} پیدا نشد.")
+        channel = config_store.get_channel(source_url)
+        if channel is None:
+            await update.message.reply_text(f"کانال مبدأ {source_url} پیدا نشد.")
+            return
+        added, existing = [], []
+        for dest_channel in dict.fromkeys(args[1:]):
+            if dest_channel not in channel['dest_channels']:
+                channel['dest_channels'].append(dest_channel)
+                added.append(dest_channel)
+            else:
+                existing.append(dest_channel)
+        if added:
+            save_config(config)
+        await update.message.reply_text(batch_summary(
+            added, f"کانال مقصد {{}} به {source_url} اضافه شد.",
+            existing, f"کانال مقصد {{}} قبلاً برای {source_url} وجود دارد."
+        ))
     else:
         await update.message.reply_text("شما اجازه تغییر تنظیمات را ندارید.")
 
@@ -323,21 +2109,28 @@ async def remove_destination(update, context):
             await update.message.reply_text("لطفاً URL کانال مبدأ و کانال مقصد را وارد کنید. مثال:\n/removedestination https://t.me/s/channel @destination")
             return
         source_url = args[0]
-        dest_channel = args[1]
-        for channel in config['channels']:
-            if channel['source_url'] == source_url:
-                if dest_channel in channel['dest_channels']:
-                    channel['dest_channels'].remove(dest_channel)
-                    save_config(config)
-                    await update.message.reply_text(f"کانال مقصد {dest_channel} از {source_url} حذف شد.")
-                    if not channel['dest_channels']:
-                        config['channels'].remove(channel)
-                        save_config(config)
-                        await update.message.reply_text(f"کانال مبدأ {source_url} به دلیل نداشتن مقصد حذف شد.")
-                else:
-                    await update.message.reply_text(f"کانال مقصد {dest_channel} برای {source_url} وجود ندارد.")
-                return
-        await update.message.reply_text(f"کانال مبدأ {source_url} پیدا نشد.")
+        channel = config_store.get_channel(source_url)
+        if channel is None:
+            await update.message.reply_text(f"کانال مبدأ {source_url} پیدا نشد.")
+            return
+        removed, missing = [], []
+        for dest_channel in dict.fromkeys(args[1:]):
+            if dest_channel in channel['dest_channels']:
+                channel['dest_channels'].remove(dest_channel)
+                removed.append(dest_channel)
+            else:
+                missing.append(dest_channel)
+        if removed and not channel['dest_channels']:
+            config['channels'].remove(channel)
+            source_scheduler.cancel(source_url)
+        if removed:
+            save_config(config)
+        await update.message.reply_text(batch_summary(
+            removed, f"کانال مقصد {{}} از {source_url} حذف شد.",
+            missing, f"کانال مقصد {{}} برای {source_url} وجود ندارد."
+        ))
+        if removed and not channel['dest_channels']:
+            await update.message.reply_text(f"کانال مبدأ {source_url} به دلیل نداشتن مقصد حذف شد.")
     else:
         await update.message.reply_text("شما اجازه تغییر تنظیمات را ندارید.")
 
@@ -352,20 +2145,32 @@ async def add_word(update, context):
             await update.message.reply_text("لطفاً URL کانال مبدأ، کلمه و (اختیاری) جایگزین را وارد کنید. مثال:\n/addword https://t.me/s/channel کلمه جایگزین\nیا برای حذف:\n/addword https://t.me/s/channel کلمه")
             return
         source_url = args[0]
-        word = args[1]
-        replacement = args[2] if len(args) > 2 else ""
-        for channel in config['channels']:
-            if channel['source_url'] == source_url:
-                for item in channel['word_replacements']:
-                    if item['word'] == word:
-                        await update.message.reply_text(f"کلمه {word} قبلاً در لیست جایگزینی {source_url} وجود دارد.")
-                        return
-                channel['word_replacements'].append({'word': word, 'replacement': replacement})
-                save_config(config)
-                action = "حذف" if replacement == "" else f"جایگزینی با '{replacement}'"
-                await update.message.reply_text(f"کلمه {word} برای {action} در {source_url} اضافه شد.")
-                return
-        await update.message.reply_text(f"کانال مبدأ {source_url} پیدا نشد.")
+        if any('=' in arg for arg in args[1:]):
+            # شکل گروهی: word=replacement برای هر کلمه (بدون = یعنی حذف کلمه)
+            pairs = [tuple(arg.split('=', 1)) if '=' in arg else (arg, "") for arg in args[1:]]
+        else:
+            pairs = [(args[1], args[2] if len(args) > 2 else "")]
+        channel = config_store.get_channel(source_url)
+        if channel is None:
+            await update.message.reply_text(f"کانال مبدأ {source_url} پیدا نشد.")
+            return
+        existing_words = {item['word'] for item in channel['word_replacements']}
+        added, existing = [], []
+        for word, replacement in pairs:
+            if not word or word in existing_words:
+                existing.append(word)
+                continue
+            channel['word_replacements'].append({'word': word, 'replacement': replacement})
+            existing_words.add(word)
+            action = "حذف" if replacement == "" else f"جایگزینی با '{replacement}'"
+            added.append(f"{word} برای {action}")
+        if added:
+            save_config(config)
+            invalidate_channel_filter(source_url)
+        await update.message.reply_text(batch_summary(
+            added, f"کلمه {{}} در {source_url} اضافه شد.",
+            existing, f"کلمه {{}} قبلاً در لیست جایگزینی {source_url} وجود دارد."
+        ))
     else:
         await update.message.reply_text("شما اجازه تغییر تنظیمات را ندارید.")
 
@@ -380,14 +2185,15 @@ async def remove_word(update, context):
             await update.message.reply_text("لطفاً URL کانال مبدأ و کلمه را وارد کنید. مثال:\n/removeword https://t.me/s/channel کلمه")
             return
         source_url = args[0]
-        word = args[1]
-        for channel in config['channels']:
-            if channel['source_url'] == source_url:
-                channel['word_replacements'] = [item for item in channel['word_replacements'] if item['word'] != word]
-                save_config(config)
-                await update.message.reply_text(f"کلمه {word} از لیست جایگزینی {source_url} حذف شد.")
-                return
-        await update.message.reply_text(f"کانال مبدأ {source_url} پیدا نشد.")
+        words = list(dict.fromkeys(args[1:]))
+        channel = config_store.get_channel(source_url)
+        if channel is None:
+            await update.message.reply_text(f"کانال مبدأ {source_url} پیدا نشد.")
+            return
+        channel['word_replacements'] = [item for item in channel['word_replacements'] if item['word'] not in words]
+        save_config(config)
+        invalidate_channel_filter(source_url)
+        await update.message.reply_text(batch_summary(words, f"کلمه {{}} از لیست جایگزینی {source_url} حذف شد."))
     else:
         await update.message.reply_text("شما اجازه تغییر تنظیمات را ندارید.")
 
@@ -402,17 +2208,24 @@ async def add_black(update, context):
             await update.message.reply_text("لطفاً URL کانال مبدأ و کلمه را وارد کنید. مثال:\n/addblack https://t.me/s/channel کلمه")
             return
         source_url = args[0]
-        word = args[1]
-        for channel in config['channels']:
-            if channel['source_url'] == source_url:
-                if word not in channel['blacklist']:
-                    channel['blacklist'].append(word)
-                    save_config(config)
-                    await update.message.reply_text(f"کلمه {word} به لیست سیاه {source_url} اضافه شد.")
-                else:
-                    await update.message.reply_text(f"کلمه {word} قبلاً در لیست سیاه {source_url} وجود دارد.")
-                return
-        await update.message.reply_text(f"کانال مبدأ {source_url} پیدا نشد.")
+        channel = config_store.get_channel(source_url)
+        if channel is None:
+            await update.message.reply_text(f"کانال مبدأ {source_url} پیدا نشد.")
+            return
+        added, existing = [], []
+        for word in dict.fromkeys(args[1:]):
+            if word not in channel['blacklist']:
+                channel['blacklist'].append(word)
+                added.append(word)
+            else:
+                existing.append(word)
+        if added:
+            save_config(config)
+            invalidate_channel_filter(source_url)
+        await update.message.reply_text(batch_summary(
+            added, f"کلمه {{}} به لیست سیاه {source_url} اضافه شد.",
+            existing, f"کلمه {{}} قبلاً در لیست سیاه {source_url} وجود دارد."
+        ))
     else:
         await update.message.reply_text("شما اجازه تغییر تنظیمات را ندارید.")
 
@@ -427,17 +2240,24 @@ async def remove_black(update, context):
             await update.message.reply_text("لطفاً URL کانال مبدأ و کلمه را وارد کنید. مثال:\n/removeblack https://t.me/s/channel کلمه")
             return
         source_url = args[0]
-        word = args[1]
-        for channel in config['channels']:
-            if channel['source_url'] == source_url:
-                if word in channel['blacklist']:
-                    channel['blacklist'].remove(word)
-                    save_config(config)
-                    await update.message.reply_text(f"کلمه {word} از لیست سیاه {source_url} حذف شد.")
-                else:
-                    await update.message.reply_text(f"کلمه {word} در لیست سیاه {source_url} وجود ندارد.")
-                return
-        await update.message.reply_text(f"کانال مبدأ {source_url} پیدا نشد.")
+        channel = config_store.get_channel(source_url)
+        if channel is None:
+            await update.message.reply_text(f"کانال مبدأ {source_url} پیدا نشد.")
+            return
+        removed, missing = [], []
+        for word in dict.fromkeys(args[1:]):
+            if word in channel['blacklist']:
+                channel['blacklist'].remove(word)
+                removed.append(word)
+            else:
+                missing.append(word)
+        if removed:
+            save_config(config)
+            invalidate_channel_filter(source_url)
+        await update.message.reply_text(batch_summary(
+            removed, f"کلمه {{}} از لیست سیاه {source_url} حذف شد.",
+            missing, f"کلمه {{}} در لیست سیاه {source_url} وجود ندارد."
+        ))
     else:
         await update.message.reply_text("شما اجازه تغییر تنظیمات را ندارید.")
 
@@ -452,17 +2272,24 @@ async def add_white(update, context):
             await update.message.reply_text("لطفاً URL کانال مبدأ و کلمه را وارد کنید. مثال:\n/addwhite https://t.me/s/channel کلمه")
             return
         source_url = args[0]
-        word = args[1]
-        for channel in config['channels']:
-            if channel['source_url'] == source_url:
-                if word not in channel['whitelist']:
-                    channel['whitelist'].append(word)
-                    save_config(config)
-                    await update.message.reply_text(f"کلمه {word} به لیست سفید {source_url} اضافه شد.")
-                else:
-                    await update.message.reply_text(f"کلمه {word} قبلاً در لیست سفید {source_url} وجود دارد.")
-                return
-        await update.message.reply_text(f"کانال مبدأ {source_url} پیدا نشد.")
+        channel = config_store.get_channel(source_url)
+        if channel is None:
+            await update.message.reply_text(f"کانال مبدأ {source_url} پیدا نشد.")
+            return
+        added, existing = [], []
+        for word in dict.fromkeys(args[1:]):
+            if word not in channel['whitelist']:
+                channel['whitelist'].append(word)
+                added.append(word)
+            else:
+                existing.append(word)
+        if added:
+            save_config(config)
+            invalidate_channel_filter(source_url)
+        await update.message.reply_text(batch_summary(
+            added, f"کلمه {{}} به لیست سفید {source_url} اضافه شد.",
+            existing, f"کلمه {{}} قبلاً در لیست سفید {source_url} وجود دارد."
+        ))
     else:
         await update.message.reply_text("شما اجازه تغییر تنظیمات را ندارید.")
 
@@ -477,17 +2304,24 @@ async def remove_white(update, context):
             await update.message.reply_text("لطفاً URL کانال مبدأ و کلمه را وارد کنید. مثال:\n/removewhite https://t.me/s/channel کلمه")
             return
         source_url = args[0]
-        word = args[1]
-        for channel in config['channels']:
-            if channel['source_url'] == source_url:
-                if word in channel['whitelist']:
-                    channel['whitelist'].remove(word)
-                    save_config(config)
-                    await update.message.reply_text(f"کلمه {word} از لیست سفید {source_url} حذف شد.")
-                else:
-                    await update.message.reply_text(f"کلمه {word} در لیست سفید {source_url} وجود ندارد.")
-                return
-        await update.message.reply_text(f"کانال مبدأ {source_url} پیدا نشد.")
+        channel = config_store.get_channel(source_url)
+        if channel is None:
+            await update.message.reply_text(f"کانال مبدأ {source_url} پیدا نشد.")
+            return
+        removed, missing = [], []
+        for word in dict.fromkeys(args[1:]):
+            if word in channel['whitelist']:
+                channel['whitelist'].remove(word)
+                removed.append(word)
+            else:
+                missing.append(word)
+        if removed:
+            save_config(config)
+            invalidate_channel_filter(source_url)
+        await update.message.reply_text(batch_summary(
+            removed, f"کلمه {{}} از لیست سفید {source_url} حذف شد.",
+            missing, f"کلمه {{}} در لیست سفید {source_url} وجود ندارد."
+        ))
     else:
         await update.message.reply_text("شما اجازه تغییر تنظیمات را ندارید.")
 
@@ -503,6 +2337,7 @@ async def stop_all(update, context):
         for channel in config['channels']:
             channel['is_active'] = False
         save_config(config)
+        source_scheduler.sync()
         await update.message.reply_text("کپی از همه کانال‌ها متوقف شد.")
     else:
         await update.message.reply_text("شما اجازه تغییر تنظیمات را ندارید.")
@@ -518,7 +2353,10 @@ async def start_all(update, context):
             return
         for channel in config['channels']:
             channel['is_active'] = True
+            circuit_breaker.reset(channel['source_url'])
         save_config(config)
+        state_store.commit()
+        source_scheduler.sync()
         await update.message.reply_text("کپی از همه کانال‌ها شروع شد.")
     else:
         await update.message.reply_text("شما اجازه تغییر تنظیمات را ندارید.")
@@ -534,13 +2372,14 @@ async def stop_channel(update, context):
             await update.message.reply_text("لطفاً URL کانال مبدأ را وارد کنید. مثال:\n/stop https://t.me/s/channel")
             return
         source_url = args[0]
-        for channel in config['channels']:
-            if channel['source_url'] == source_url:
-                channel['is_active'] = False
-                save_config(config)
-                await update.message.reply_text(f"کپی از کانال {source_url} متوقف شد.")
-                return
-        await update.message.reply_text(f"کانال مبدأ {source_url} پیدا نشد.")
+        channel = config_store.get_channel(source_url)
+        if channel is None:
+            await update.message.reply_text(f"کانال مبدأ {source_url} پیدا نشد.")
+            return
+        channel['is_active'] = False
+        save_config(config)
+        source_scheduler.cancel(source_url)
+        await update.message.reply_text(f"کپی از کانال {source_url} متوقف شد.")
     else:
         await update.message.reply_text("شما اجازه تغییر تنظیمات را ندارید.")
 
@@ -555,13 +2394,46 @@ async def startchannel(update, context):
             await update.message.reply_text("لطفاً URL کانال مبدأ را وارد کنید. مثال:\n/startchannel https://t.me/s/channel")
             return
         source_url = args[0]
-        for channel in config['channels']:
-            if channel['source_url'] == source_url:
-                channel['is_active'] = True
-                save_config(config)
-                await update.message.reply_text(f"کپی از کانال {source_url} شروع شد.")
-                return
-        await update.message.reply_text(f"کانال مبدأ {source_url} پیدا نشد.")
+        channel = config_store.get_channel(source_url)
+        if channel is None:
+            await update.message.reply_text(f"کانال مبدأ {source_url} پیدا نشد.")
+            return
+        channel['is_active'] = True
+        save_config(config)
+        circuit_breaker.reset(source_url)
+        state_store.commit()
+        source_scheduler.schedule(source_url, delay=0)
+        await update.message.reply_text(f"کپی از کانال {source_url} شروع شد.")
+    else:
+        await update.message.reply_text("شما اجازه تغییر تنظیمات را ندارید.")
+
+async def set_digest(update, context):
+    """دستور تنظیم پنجره حالت digest (تجمیع پست‌ها) برای یک کانال"""
+    config = load_config()
+    user_id = update.effective_user.id
+
+    if not config['admin_ids'] or user_id in config['admin_ids']:
+        args = context.args
+        if len(args) != 2 or not args[1].isdigit():
+            await update.message.reply_text(
+                "لطفاً URL کانال مبدأ و طول پنجره (ثانیه) را وارد کنید. مثال:\n/digest https://t.me/s/channel 60\n"
+                "با 0 حالت digest خاموش می‌شود."
+            )
+            return
+        source_url, window = args[0], int(args[1])
+        channel = config_store.get_channel(source_url)
+        if channel is None:
+            await update.message.reply_text(f"کانال مبدأ {source_url} پیدا نشد.")
+            return
+        if window:
+            channel['digest_window'] = window
+        else:
+            channel.pop('digest_window', None)
+        save_config(config)
+        if window:
+            await update.message.reply_text(f"پست‌های متنی {source_url} هر {window} ثانیه در یک پیام ارسال می‌شوند.")
+        else:
+            await update.message.reply_text(f"حالت digest برای {source_url} خاموش شد.")
     else:
         await update.message.reply_text("شما اجازه تغییر تنظیمات را ندارید.")
 
@@ -575,7 +2447,13 @@ async def get_config(update, context):
         for ch in config['channels']:
             channels_info += f"مبدأ: {ch['source_url']}\n"
             channels_info += f"  وضعیت: {'فعال' if ch.get('is_active', True) else 'غیرفعال'}\n"
+            health = circuit_breaker.describe(ch['source_url'])
+            if health:
+                channels_info += f"  سلامت: {health}\n"
             channels_info += f"  مقصد‌ها: {', '.join(ch['dest_channels'])}\n"
+            channels_info += f"  فاصله بررسی: {source_scheduler.interval(ch['source_url']):.0f} ثانیه\n"
+            if ch.get('digest_window'):
+                channels_info += f"  حالت digest: هر {ch['digest_window']} ثانیه\n"
             channels_info += f"  کلمات برای جایگزینی/حذف:\n"
             channels_info += "\n".join(
                 f"    کلمه: {item['word']}, جایگزین: {item['replacement'] or 'حذف'}"
@@ -594,35 +2472,794 @@ async def get_config(update, context):
     else:
         await update.message.reply_text("شما اجازه مشاهده تنظیمات را ندارید.")
 
+async def import_config(update, context):
+    """دستور وارد کردن گروهی کانال‌ها از فایل JSON/CSV یا متن پیام؛ همه تغییرات با یک ذخیره اعمال می‌شوند"""
+    config = load_config()
+    user_id = update.effective_user.id
+
+    if not config['admin_ids'] or user_id in config['admin_ids']:
+        message = update.message
+        # آرگومان‌ها از CommandHandler یا (برای فایل همراه دستور) از کپشن فایل
+        args = context.args if context.args is not None else (message.caption or '').split()[1:]
+        mode_given = bool(args) and args[0].lower() in ('merge', 'replace')
+        replace = mode_given and args[0].lower() == 'replace'
+        document = message.document or (message.reply_to_message.document if message.reply_to_message else None)
+        try:
+            if document is not None:
+                if document.file_size and document.file_size > CONFIG_IMPORT_MAX_BYTES:
+                    await update.message.reply_text(f"حجم فایل بیشتر از {CONFIG_IMPORT_MAX_BYTES // 1024} کیلوبایت است.")
+                    return
+                telegram_file = await document.get_file()
+                data = bytes(await telegram_file.download_as_bytearray())
+                items = parse_channels_document(data, document.file_name or '')
+            else:
+                # محتوای فایل می‌تواند مستقیم بعد از دستور (و حالت اختیاری) نوشته شود
+                parts = (message.text or '').split(None, 2 if mode_given else 1)
+                body = parts[-1] if len(parts) == (3 if mode_given else 2) else ''
+                if not body.strip():
+                    await update.message.reply_text(
+                        "لطفاً فایل JSON یا CSV کانال‌ها را با کپشن /import بفرستید، به آن با /import پاسخ دهید "
+                        "یا محتوا را بعد از دستور بنویسید. مثال:\n"
+                        "/import merge {\"channels\": [{\"source_url\": \"https://t.me/s/channel\", \"dest_channels\": [\"@destination\"]}]}\n"
+                        "قالب فایل مثل خروجی /export است؛ replace همه کانال‌های فعلی را جایگزین می‌کند."
+                    )
+                    return
+                items = parse_channels_document(body)
+        except (ValueError, csv.Error) as e:
+            await update.message.reply_text(f"فایل قابل خواندن نیست: {str(e)}")
+            return
+        except TelegramError as e:
+            await update.message.reply_text(f"خطا در دریافت فایل: {str(e)}")
+            return
+
+        existing_urls = set() if replace else {channel['source_url'] for channel in config['channels']}
+        channels, errors = validate_channels(items, existing_urls)
+        if errors:
+            shown = '\n'.join(errors[:20])
+            more = f"\n... و {len(errors) - 20} خطای دیگر" if len(errors) > 20 else ''
+            await update.message.reply_text(f"هیچ تغییری اعمال نشد. خطاها:\n{shown}{more}")
+            return
+
+        # اعمال در حافظه بدون وقفه، سپس یک ذخیره و یک بار بازسازی فیلترها و زمان‌بندی‌ها
+        added, updated, removed = apply_channels(config, channels, replace)
+        save_config(config)
+        for source_url in added + updated + removed:
+            invalidate_channel_filter(source_url)
+        for source_url in removed:
+            state_store.delete_cursor(source_url)
+            state_store.delete_message_index(source_url)
+            circuit_breaker.reset(source_url)
+        state_store.commit()
+        source_scheduler.sync()
+        await update.message.reply_text(
+            f"وارد کردن انجام شد ({'replace' if replace else 'merge'}): "
+            f"{len(added)} کانال جدید، {len(updated)} به‌روزرسانی، {len(removed)} حذف."
+        )
+    else:
+        await update.message.reply_text("شما اجازه تغییر تنظیمات را ندارید.")
+
+async def export_config(update, context):
+    """دستور دریافت فایل JSON یا CSV کانال‌ها (بدون توکن و ادمین‌ها)"""
+    config = load_config()
+    user_id = update.effective_user.id
+
+    if not config['admin_ids'] or user_id in config['admin_ids']:
+        export_format = context.args[0].lower() if context.args else 'json'
+        if export_format not in ('json', 'csv'):
+            await update.message.reply_text("قالب باید json یا csv باشد. مثال:\n/export csv")
+            return
+        if export_format == 'csv':
+            data = channels_to_csv(config['channels'])
+        else:
+            data = json.dumps({'channels': config['channels']}, ensure_ascii=False, indent=2)
+        await update.message.reply_document(
+            document=data.encode('utf-8'),
+            filename=f"channels.{export_format}",
+            caption=f"{len(config['channels'])} کانال"
+        )
+    else:
+        await update.message.reply_text("شما اجازه مشاهده تنظیمات را ندارید.")
+
+async def get_stats(update, context):
+    """نمایش آمار کش صفحات و ارسال"""
+    config = load_config()
+    user_id = update.effective_user.id
+
+    if not config['admin_ids'] or user_id in config['admin_ids']:
+        hits = PAGE_CACHE_STATS['hits']
+        misses = PAGE_CACHE_STATS['misses']
+        avg_parse = PAGE_CACHE_STATS['parse_seconds'] / misses if misses else 0.0
+        await update.message.reply_text(
+            f"آمار کش صفحات:\n"
+            f"  بدون تغییر (hit): {hits} (پاسخ 304: {PAGE_CACHE_STATS['not_modified']})\n"
+            f"  تغییرکرده (miss): {misses}\n"
+            f"  میانگین زمان پارس: {avg_parse * 1000:.1f} میلی‌ثانیه\n"
+            f"  زمان پارس صرفه‌جویی‌شده (تخمینی): {hits * avg_parse:.2f} ثانیه\n"
+            f"آمار ارسال:\n"
+            f"  موفق: {DELIVERY_STATS['sent']}، ناموفق: {DELIVERY_STATS['failed']}\n"
+            f"  تلاش مجدد: {DELIVERY_STATS['retries']}، RetryAfter: {DELIVERY_STATS['retry_after']}\n"
+            f"  مقصدهای غیرقابل دسترس: {', '.join(reachability.unreachable()) or 'هیچ'}\n"
+            f"  ارسال تکراری حذف‌شده: {DEDUP_STATS['suppressed']}\n"
+            f"  ارسال‌های ناتمام (outbox): {state_store.outbox_count()}\n"
+            f"  پست‌های تجمیع‌شده (digest): {DIGEST_STATS['posts']} در {DIGEST_STATS['messages']} پیام\n"
+            f"خطاهای فعال: {alerts.active()}"
+        )
+    else:
+        await update.message.reply_text("شما اجازه مشاهده تنظیمات را ندارید.")
+
+async def reprobe_destinations(context):
+    """بررسی مجدد دوره‌ای مقصدهای غیرقابل دسترس"""
+    await reachability.reprobe(context)
+
+async def startup_probe(context):
+    """بررسی بی‌صدا و هم‌زمان دسترسی به همه مقصدها هنگام شروع و ارسال یک گزارش خلاصه"""
+    probe_started = time.perf_counter()
+    dest_channels = sorted({
+        dest_channel for channel in load_config()['channels'] for dest_channel in channel['dest_channels']
+    })
+    reachable = await reachability.filter_reachable(context, dest_channels)
+    logger.info(
+        f"دسترسی به {len(reachable)} از {len(dest_channels)} مقصد در "
+        f"{time.perf_counter() - probe_started:.2f} ثانیه بررسی شد."
+    )
+    # مقصدهای غیرقابل دسترس در یک خلاصه به ادمین‌ها گزارش می‌شوند
+    await alerts.flush(context)
+
+async def flush_alerts(context):
+    """ارسال دوره‌ای خلاصه خطاها به ادمین‌ها"""
+    await alerts.flush(context)
+
+async def reload_config(context):
+    """بارگذاری مجدد تنظیمات در صورت تغییر فایل روی دیسک"""
+    if config_store.reload_if_changed():
+        source_scheduler.sync()
+
 async def check_new_posts(application):
     """چک کردن پست‌های جدید برای هر کانال مبدأ"""
     config = load_config()
     if not config['channels']:
         error_message = "هیچ کانال مبدأ یا مقصدی تنظیم نشده است!"
         logger.error(error_message)
-        await notify_admins(application, error_message)
+        alerts.report('config', '', error_message)
         return
+    alerts.resolve('config', '')
+
+    # دریافت هم‌زمان همه کانال‌ها تا مهلت دور؛ کانال‌های کند دور بعد را معطل نمی‌کنند
+    tick_started = time.perf_counter()
+    await source_runner.run_tick(application, config['channels'], config.get('tick_deadline', TICK_DEADLINE))
+    # ثبت یکجای cursorهای این دور
+    state_store.commit()
+    record_tick(time.perf_counter() - tick_started, CHECK_INTERVAL)
+
+def record_tick(duration, interval, source_url=''):
+    """ثبت مدت یک دور/بررسی و شمارش دورهایی که از فاصله خود طولانی‌تر شدند"""
+    labels = {'source': source_url} if source_url else {}
+    metrics.last_tick = time.time()
+    metrics.observe('bot_tick_seconds', duration, **labels)
+    if duration > interval:
+        metrics.inc('bot_tick_overrun_total', **labels)
+        logger.warning(f"بررسی {source_url or 'همه کانال‌ها'} {duration:.1f} ثانیه طول کشید (بیشتر از فاصله {interval:.1f} ثانیه).")
+
+DEDUP_STATS = {'suppressed': 0}
+metrics.describe('bot_dedup_suppressed_total', 'counter', 'Sends skipped as cross-source duplicates')
+metrics.add_collector(lambda: [('bot_dedup_suppressed_total', {}, DEDUP_STATS['suppressed'])])
+
+class DedupIndex:
+    """شاخص محدود اثر انگشت محتوای ارسال‌شده به هر مقصد با حذف بر اساس زمان (LRU)"""
+
+    def __init__(self):
+        self._seen = {}  # dest_channel -> OrderedDict(fingerprint -> (timestamp, source_url))
+
+    @staticmethod
+    def fingerprint(text):
+        """اثر انگشت متن نرمال‌شده (بدون حساسیت به حروف بزرگ/کوچک، علائم و فاصله‌ها)"""
+        normalized = ' '.join(re.sub(r'[^\w]+', ' ', text.casefold()).split())
+        return hashlib.blake2b(normalized.encode('utf-8'), digest_size=8).digest()
+
+    def claim(self, dest_channel, fingerprint, source_url, window, max_entries):
+        """رزرو ارسال؛ اگر همین محتوا از مبدأ دیگری در پنجره زمانی ارسال شده باشد False"""
+        now = time.monotonic()
+        seen = self._seen.setdefault(dest_channel, OrderedDict())
+        # ورودی‌ها به ترتیب زمان هستند، پس حذف منقضی‌ها از ابتدا کافی است
+        while seen:
+            oldest = next(iter(seen.values()))
+            if now - oldest[0] < window and len(seen) < max_entries:
+                break
+            seen.popitem(last=False)
+        entry = seen.get(fingerprint)
+        if entry is not None and entry[1] != source_url:
+            return False
+        seen[fingerprint] = (now, source_url)
+        seen.move_to_end(fingerprint)
+        return True
 
-    for channel in config['channels']:
+    def release(self, dest_channel, fingerprint):
+        """لغو رزرو پس از ارسال ناموفق"""
+        seen = self._seen.get(dest_channel)
+        if seen is not None:
+            seen.pop(fingerprint, None)
+
+    def filter(self, text, source_url, dest_channels):
+        """برگرداندن مقصدهایی که این محتوا را هنوز از مبدأ دیگری دریافت نکرده‌اند"""
+        config = load_config()
+        window = config.get('dedup_window', DEDUP_WINDOW)
+        if not window:
+            return dest_channels
+        max_entries = config.get('dedup_max_entries', DEDUP_MAX_ENTRIES)
+        fingerprint = self.fingerprint(text)
+        allowed = [
+            dest_channel for dest_channel in dest_channels
+            if self.claim(dest_channel, fingerprint, source_url, window, max_entries)
+        ]
+        if len(allowed) < len(dest_channels):
+            DEDUP_STATS['suppressed'] += len(dest_channels) - len(allowed)
+            logger.info(f"پست تکراری از {source_url} به {len(dest_channels) - len(allowed)} مقصد ارسال نشد: {text[:50]}...")
+        return allowed
+
+dedup_index = DedupIndex()
+
+DIGEST_STATS = {'posts': 0, 'messages': 0}
+metrics.describe('bot_digest_total', 'counter', 'Posts merged into digest messages and digest messages sent')
+metrics.add_collector(lambda: [
+    ('bot_digest_total', {'kind': 'posts'}, DIGEST_STATS['posts']),
+    ('bot_digest_total', {'kind': 'messages'}, DIGEST_STATS['messages'])
+])
+
+def split_digest(texts, max_length):
+    """گروه‌بندی متن‌ها به ترتیب در پیام‌هایی با حداکثر max_length کاراکتر (پست‌ها هرگز نصف نمی‌شوند)؛ لیست اندیس‌های هر پیام"""
+    groups = []
+    length = 0
+    for index, text in enumerate(texts):
+        if groups and length + len(DIGEST_SEPARATOR) + len(text) <= max_length:
+            groups[-1].append(index)
+            length += len(DIGEST_SEPARATOR) + len(text)
+        else:
+            # پستی که به‌تنهایی از سقف بلندتر است مثل حالت عادی جداگانه ارسال می‌شود
+            groups.append([index])
+            length = len(text)
+    return groups
+
+class DigestBuffer:
+    """نگه‌داشتن پست‌های متنی کانال‌های حالت digest و ارسال آن‌ها در یک پیام برای هر مقصد"""
+
+    def __init__(self):
+        self._posts = {}  # source_url -> [(post, targets, content)] به ترتیب انتشار
+        self._jobs = {}  # source_url -> job ارسال در پایان پنجره
+
+    async def add(self, application, source_url, post, targets, content, window):
+        posts = self._posts.setdefault(source_url, [])
+        posts.append((post, targets, content))
+        length = sum(len(item[0]['text']) for item in posts) + len(DIGEST_SEPARATOR) * (len(posts) - 1)
+        if length >= load_config().get('digest_max_length', DIGEST_MAX_LENGTH):
+            await self.flush(application, source_url)
+        elif source_url not in self._jobs:
+            # پنجره از اولین پست نگه‌داشته‌شده شروع می‌شود
+            self._jobs[source_url] = application.job_queue.run_once(
+                flush_digest, when=window, data=source_url, name=f"digest:{source_url}"
+            )
+
+    async def flush(self, application, source_url):
+        """ارسال پست‌های نگه‌داشته‌شده یک کانال؛ هر مقصد پیام(های) خلاصه خودش را به ترتیب دریافت می‌کند"""
+        job = self._jobs.pop(source_url, None)
+        if job is not None:
+            job.schedule_removal()
+        posts = self._posts.pop(source_url, None)
+        if not posts:
+            return
+        max_length = load_config().get('digest_max_length', DIGEST_MAX_LENGTH)
+        dest_channels = dict.fromkeys(dest_channel for _, targets, _ in posts for dest_channel in targets)
+        sends = []
+        # همه پیام‌ها بدون وقفه به صف اضافه می‌شوند تا ترتیب آن‌ها با ارسال‌های بعدی همین مقصد حفظ شود
+        for dest_channel in dest_channels:
+            dest_posts = [item for item in posts if dest_channel in item[1]]
+            for group in split_digest([item[0]['text'] for item in dest_posts], max_length):
+                chunk = [dest_posts[index] for index in group]
+                text = DIGEST_SEPARATOR.join(item[0]['text'] for item in chunk)
+                sends.append((dest_channel, chunk, delivery_queue.submit(application, text, dest_channel)))
+        results = await asyncio.gather(*(future for _, _, future in sends))
+        delivered_posts = set()
+        for (dest_channel, chunk, _), delivered in zip(sends, results):
+            for post, _, content in chunk:
+                if delivered:
+                    state_store.outbox_done(source_url, post['post_id'], dest_channel)
+                    delivered_posts.add(post['post_id'])
+                else:
+                    state_store.outbox_failed(source_url, post['post_id'], dest_channel)
+                    dedup_index.release(dest_channel, dedup_index.fingerprint(content))
+        state_store.commit()
+        for _ in delivered_posts:
+            metrics.inc('bot_posts_delivered_total', source=source_url)
+        DIGEST_STATS['posts'] += len(posts)
+        DIGEST_STATS['messages'] += len(sends)
+        logger.info(f"{len(posts)} پست از {source_url} در {len(sends)} پیام خلاصه به {len(dest_channels)} مقصد ارسال شد.")
+
+    async def flush_all(self, application):
+        for source_url in list(self._posts):
+            await self.flush(application, source_url)
+
+    def job_done(self, source_url):
+        """حذف job اجراشده از لیست (jobها یک‌بارمصرف هستند)"""
+        self._jobs.pop(source_url, None)
+
+digests = DigestBuffer()
+
+async def flush_digest(context):
+    """job ارسال پیام خلاصه یک کانال در پایان پنجره digest"""
+    digests.job_done(context.job.data)
+    await digests.flush(context, context.job.data)
+
+async def process_channel(application, channel):
+    """اسکرپ یک کانال مبدأ و ارسال پست جدید به مقصدها؛ تعداد پست‌های جدید را برمی‌گرداند"""
+    source_url = channel['source_url']
+    posts, changes = await scrape_channel(source_url)
+    # cursor و ورودی‌های outbox پیش از اولین ارسال با هم روی دیسک ثبت می‌شوند؛ تراکنش نوشتن هیچ‌وقت
+    # در طول یک await باز نمی‌ماند تا shardهای دیگر که همین فایل را می‌نویسند منتظر قفل SQLite نمانند
+    state_store.commit()
+    if changes:
+        await propagate_changes(application, source_url, changes)
+    if not posts:
+        return 0
+    # مقصدهای غیرقابل دسترس (طبق کش) کنار گذاشته می‌شوند
+    dest_channels = await reachability.filter_reachable(application, channel['dest_channels'])
+
+    # ارسال پست‌های جدید به ترتیب انتشار؛ هر پست هم‌زمان به همه مقصدها
+    for post in posts:
+        post_id = post['post_id']
+        # حذف نسخه‌های تکراری همین محتوا که از مبدأهای دیگر به این مقصدها رسیده‌اند
+        # (برای رسانه بدون متن، آدرس رسانه‌ها محتوای پست حساب می‌شود)
+        content = post['text'] or ' '.join(media_url for _, media_url in post['media'])
+        targets = dedup_index.filter(
+            content, source_url, [dest_channel for dest_channel in dest_channels if dest_channel in post['pending']]
+        )
+        for dest_channel in post['pending']:
+            if dest_channel not in targets:
+                state_store.outbox_done(source_url, post_id, dest_channel)
+        state_store.commit()
+        if channel.get('digest_window') and not post['media']:
+            # پست متنی تا پایان پنجره (یا رسیدن به سقف طول) نگه‌داشته و با پست‌های بعدی یکجا ارسال می‌شود
+            if targets:
+                await digests.add(application, source_url, post, targets, content, channel['digest_window'])
+            continue
+        # پست‌های نگه‌داشته‌شده قبل از پست رسانه‌ای ارسال می‌شوند تا ترتیب حفظ شود
+        await digests.flush(application, source_url)
+        results = await delivery_queue.fan_out(application, post['text'], targets, post['media'])
+        for dest_channel, delivered in zip(targets, results):
+            if delivered:
+                state_store.outbox_done(source_url, post_id, dest_channel)
+            else:
+                state_store.outbox_failed(source_url, post_id, dest_channel)
+                dedup_index.release(dest_channel, dedup_index.fingerprint(content))
+        if any(results):
+            metrics.inc('bot_posts_delivered_total', source=source_url)
+            if not post['media']:
+                # شناسه پیام‌ها برای انتقال ویرایش یا حذف بعدی همین پست نگه‌داشته می‌شود
+                content_hash = post_hash(post['text'])
+                messages = [
+                    (dest_channel, message_id, content_hash) for dest_channel, message_id in zip(targets, results) if message_id
+                ]
+                state_store.set_message_index(
+                    source_url, post_id, post['source_hash'], messages,
+                    load_config().get('message_index_size', MESSAGE_INDEX_SIZE)
+                )
+        # نتیجه هر پست بلافاصله ثبت می‌شود تا پس از crash در میانه یک catch-up طولانی دوباره ارسال نشود
+        state_store.commit()
+    return len(posts)
+
+PROPAGATION_STATS = {'edited': 0, 'deleted': 0, 'failed': 0}
+metrics.describe('bot_propagated_total', 'counter', 'Source edits and deletions applied to destination messages')
+metrics.add_collector(lambda: [('bot_propagated_total', {'result': result}, count) for result, count in PROPAGATION_STATS.items()])
+
+async def update_message(application, dest_channel, message_id, text):
+    """ویرایش (یا حذف اگر text برابر None باشد) یک پیام ارسال‌شده با رعایت RetryAfter
+
+    نتیجه True برای انجام‌شده، False اگر پیام دیگر وجود ندارد و None برای خطای موقت (تلاش در تغییر بعدی صفحه) است.
+    """
+    while True:
+        await delivery_queue.acquire(dest_channel)
+        try:
+            if text is None:
+                await application.bot.delete_message(chat_id=dest_channel, message_id=message_id)
+                PROPAGATION_STATS['deleted'] += 1
+            else:
+                await application.bot.edit_message_text(text=text, chat_id=dest_channel, message_id=message_id)
+                PROPAGATION_STATS['edited'] += 1
+            return True
+        except RetryAfter as e:
+            # محدودیت flood: مقصد تا پایان زمان اعلام‌شده متوقف می‌شود و ویرایش دوباره انجام می‌شود
+            DELIVERY_STATS['retry_after'] += 1
+            logger.warning(f"محدودیت ویرایش برای {dest_channel}؛ تلاش مجدد پس از {e.retry_after} ثانیه.")
+            delivery_queue.chat_bucket(dest_channel).pause(e.retry_after)
+            continue
+        except BadRequest as e:
+            if 'not modified' in str(e).lower():
+                return True
+            # پیام در مقصد حذف شده یا دیگر قابل ویرایش نیست
+            PROPAGATION_STATS['failed'] += 1
+            logger.warning(f"پیام {message_id} در {dest_channel} به‌روزرسانی نشد: {str(e)}")
+            return False
+        except TelegramError as e:
+            PROPAGATION_STATS['failed'] += 1
+            logger.warning(f"خطا در به‌روزرسانی پیام {message_id} در {dest_channel}: {str(e)}")
+            return None
+
+async def propagate_changes(application, source_url, changes):
+    """اعمال ویرایش و حذف پست‌های مبدأ روی پیام‌های ارسال‌شده به مقصدها"""
+    keep = load_config().get('message_index_size', MESSAGE_INDEX_SIZE)
+    for post_id, text, messages, source_hash, previous_hash in changes:
+        content_hash = post_hash(text) if text is not None else None
+        # فقط پیام‌هایی که متنشان با متن جدید فرق دارد به‌روزرسانی می‌شوند
+        stale = [message for message in messages if text is None or message[2] != content_hash]
+        results = await asyncio.gather(*(
+            update_message(application, dest_channel, message_id, text) for dest_channel, message_id, _ in stale
+        ))
+        outcome = {message[:2]: result for message, result in zip(stale, results)}
+        remaining = []
+        retry = False
+        for dest_channel, message_id, message_hash in messages:
+            result = outcome.get((dest_channel, message_id), True)
+            if result is None:
+                # خطای موقت: هش قدیمی پیام می‌ماند تا در تغییر بعدی صفحه دوباره تلاش شود
+                remaining.append((dest_channel, message_id, message_hash))
+                retry = True
+            elif result and text is not None:
+                remaining.append((dest_channel, message_id, content_hash))
+        if remaining:
+            # تا همه پیام‌ها به‌روز نشده‌اند هش قبلی مبدأ می‌ماند تا پست دوباره تغییرکرده دیده شود
+            source_hash = previous_hash if retry or text is None else source_hash
+            state_store.set_message_index(source_url, post_id, source_hash, remaining, keep)
+        else:
+            state_store.delete_message_index(source_url, post_id)
+        state_store.commit()
+        done = sum(1 for result in results if result)
+        logger.info(f"{'حذف' if text is None else 'ویرایش'} پست {post_id} از {source_url} به {done} مقصد منتقل شد.")
+
+OUTBOX_STATS = {'journaled': 0, 'replayed': 0, 'compacted': 0, 'dropped': 0}
+metrics.describe('bot_outbox_total', 'counter', 'Outbox entries by event (journaled, replayed, compacted, dropped)')
+metrics.add_collector(lambda: [('bot_outbox_total', {'event': event}, count) for event, count in OUTBOX_STATS.items()])
+
+async def replay_outbox(context):
+    """ارسال دوباره ورودی‌های ناتمام outbox (از اجرای قبلی) در دسته‌های محدود هنگام شروع"""
+    config = load_config()
+    batch_size = config.get('outbox_replay_batch', OUTBOX_REPLAY_BATCH)
+    max_attempts = config.get('outbox_max_attempts', OUTBOX_MAX_ATTEMPTS)
+    # ورودی‌های ثبت‌شده توسط همین پردازه در مسیر عادی ارسال می‌شوند
+    started_at = time.time() - (time.monotonic() - STARTED_AT)
+    after = ('', 0, '')
+    replayed = 0
+    while True:
+        rows = state_store.outbox_pending(started_at, max_attempts, after, batch_size)
+        if not rows:
+            break
+        after = rows[-1][:3]
+        keys = []
+        futures = []
+        for source_url, post_id, dest_channel, text, media in rows:
+            if not source_scheduler.owns(source_url):
+                continue
+            channel = config_store.get_channel(source_url)
+            if channel is None or not channel.get('is_active', True) or dest_channel not in channel['dest_channels']:
+                # کانال یا مقصد پس از ثبت حذف یا متوقف شده است
+                state_store.outbox_done(source_url, post_id, dest_channel)
+                continue
+            # صف ارسال ترتیب پیام‌های هر مقصد را حفظ می‌کند
+            keys.append((source_url, post_id, dest_channel))
+            futures.append(delivery_queue.submit(context, text, dest_channel, media))
+        state_store.commit()
+        results = await asyncio.gather(*futures)
+        for key, delivered in zip(keys, results):
+            if delivered:
+                state_store.outbox_done(*key)
+            else:
+                state_store.outbox_failed(*key)
+        state_store.commit()
+        replayed += len(keys)
+    OUTBOX_STATS['replayed'] += replayed
+    if replayed:
+        logger.info(f"{replayed} ارسال ناتمام از اجرای قبلی دوباره انجام شد.")
+
+async def compact_outbox(context):
+    """پاک‌سازی دوره‌ای ورودی‌های انجام‌شده outbox در پس‌زمینه (خارج از مسیر ارسال)"""
+    max_attempts = load_config().get('outbox_max_attempts', OUTBOX_MAX_ATTEMPTS)
+    done, dropped = state_store.outbox_compact(max_attempts)
+    state_store.commit()
+    OUTBOX_STATS['compacted'] += done
+    OUTBOX_STATS['dropped'] += dropped
+    if dropped:
+        logger.warning(f"{dropped} ارسال پس از {max_attempts} تلاش ناموفق از outbox حذف شد.")
+
+class SourceRunner:
+    """اجرای single-flight پردازش هر کانال مبدأ؛ هر کانال در هر لحظه حداکثر یک بار در حال بررسی است"""
+
+    def __init__(self):
+        self._in_flight = {}  # source_url -> task
+        self._carried = OrderedDict()  # کانال‌هایی که از مهلت دور قبل جا ماندند (به ترتیب)
+
+    def in_flight(self, source_url):
+        return source_url in self._in_flight
+
+    def start(self, application, channel):
+        """شروع پردازش کانال؛ اگر همین کانال در حال پردازش باشد None"""
         source_url = channel['source_url']
-        dest_channels = channel['dest_channels']
-        for dest_channel in dest_channels[:]:
-            try:
-                await application.bot.get_chat(dest_channel)
-            except TelegramError as e:
-                error_message = f"دسترسی به کانال مقصد {dest_channel} ممکن نیست: {str(e)}"
-                logger.error(error_message)
-                await notify_admins(application, error_message)
+        if source_url in self._in_flight:
+            return None
+        task = asyncio.ensure_future(process_channel(application, channel))
+        self._in_flight[source_url] = task
+        task.add_done_callback(lambda done: self._finished(source_url, done))
+        return task
+
+    def _finished(self, source_url, task):
+        self._in_flight.pop(source_url, None)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"خطا در پردازش {source_url}: {str(task.exception())}")
+
+    async def run_tick(self, application, channels, deadline):
+        """یک دور بررسی با مهلت؛ کانال‌های جامانده از دور قبل اول شروع می‌شوند و کانال‌های در حال پردازش تکرار نمی‌شوند"""
+        channels_by_url = {channel['source_url']: channel for channel in channels}
+        order = [source_url for source_url in self._carried if source_url in channels_by_url]
+        order += [source_url for source_url in channels_by_url if source_url not in self._carried]
+        tasks = {}
+        for source_url in order:
+            task = self.start(application, channels_by_url[source_url])
+            if task is None:
+                metrics.inc('bot_tick_skipped_total', source=source_url)
                 continue
+            self._carried.pop(source_url, None)
+            tasks[task] = source_url
+        if not tasks:
+            return
+        # کارهای جامانده لغو نمی‌شوند (ممکن است وسط ارسال باشند) و در پس‌زمینه تمام می‌شوند
+        _, pending = await asyncio.wait(tasks, timeout=deadline or None)
+        for task in pending:
+            source_url = tasks[task]
+            self._carried[source_url] = True
+            metrics.inc('bot_tick_overrun_total', source=source_url)
+        if pending:
+            logger.warning(f"{len(pending)} کانال تا مهلت {deadline} ثانیه تمام نشد؛ دور بعد با اولویت بررسی می‌شوند.")
+
+    async def stop(self):
+        tasks = list(self._in_flight.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+source_runner = SourceRunner()
+
+class SourceScheduler:
+    """زمان‌بندی جداگانه هر کانال مبدأ با فاصله تطبیقی بر اساس فراوانی پست‌ها"""
+
+    def __init__(self):
+        self.job_queue = None
+        self.owner = None  # نام shard در حالت چندپردازه‌ای
+        self._ring = None
+        self._index = None
+        self._jobs = {}  # source_url -> Job
+        self._intervals = {}  # source_url -> فاصله فعلی (ثانیه)
+
+    def set_partition(self, index, count):
+        """محدود کردن این پردازه به بخشی از کانال‌ها طبق حلقه هش سازگار"""
+        self.owner = f"shard-{index}"
+        self._ring = HashRing(range(count))
+        self._index = index
+
+    def owns(self, source_url):
+        return self._ring is None or self._ring.node_for(source_url) == self._index
+
+    def start(self, application):
+        """ساخت job برای همه کانال‌های فعال؛ اولین بررسی‌ها بلافاصله و پخش‌شده در چند ثانیه اول انجام می‌شوند"""
+        self.job_queue = application.job_queue
+        for channel in load_config()['channels']:
+            if channel.get('is_active', True) and self.owns(channel['source_url']):
+                self.schedule(channel['source_url'], delay=random.uniform(0, STARTUP_POLL_SPREAD))
+
+    def _limits(self):
+        config = load_config()
+        return (
+            config.get('poll_min_interval', POLL_MIN_INTERVAL),
+            config.get('poll_max_interval', POLL_MAX_INTERVAL)
+        )
+
+    def schedule(self, source_url, delay=None):
+        """ساخت (یا جایگزینی) job بررسی یک کانال"""
+        if self.job_queue is None or not self.owns(source_url):
+            return
+        self.cancel(source_url)
+        if delay is None:
+            interval = self._intervals.get(source_url, CHECK_INTERVAL)
+            jitter = load_config().get('poll_jitter', POLL_JITTER)
+            delay = interval * random.uniform(1 - jitter, 1 + jitter)
+        self._jobs[source_url] = self.job_queue.run_once(
+            poll_source, when=delay, data=source_url, name=f"poll:{source_url}"
+        )
 
-        text = scrape_channel(source_url)
-        if text:
-            for dest_channel in dest_channels:
-                await send_to_channel(application, text, dest_channel)
+    def cancel(self, source_url):
+        job = self._jobs.pop(source_url, None)
+        if job is not None:
+            job.schedule_removal()
 
-async def main():
+    def sync(self):
+        """هماهنگ کردن jobها با تنظیمات فعلی (پس از تغییرات گروهی یا بارگذاری مجدد)"""
+        if self.job_queue is None:
+            return
+        active = {
+            channel['source_url'] for channel in load_config()['channels']
+            if channel.get('is_active', True) and self.owns(channel['source_url'])
+        }
+        for source_url in list(self._jobs):
+            if source_url not in active:
+                self.cancel(source_url)
+        for source_url in active - set(self._jobs):
+            self.schedule(source_url, delay=random.uniform(0, POLL_MIN_INTERVAL))
+
+    def record(self, source_url, new_posts):
+        """به‌روزرسانی فاصله: پست جدید یعنی کمترین فاصله، بررسی بی‌نتیجه یعنی افزایش تدریجی فاصله"""
+        min_interval, max_interval = self._limits()
+        if new_posts:
+            interval = min_interval
+        else:
+            interval = self._intervals.get(source_url, CHECK_INTERVAL) * load_config().get('poll_backoff', POLL_BACKOFF)
+        self._intervals[source_url] = max(min_interval, min(max_interval, interval))
+
+    def interval(self, source_url):
+        return self._intervals.get(source_url, CHECK_INTERVAL)
+
+    def is_scheduled(self, source_url):
+        return source_url in self._jobs
+
+    def job_done(self, source_url):
+        """حذف job اجراشده از لیست (jobها یک‌بارمصرف هستند)"""
+        self._jobs.pop(source_url, None)
+
+source_scheduler = SourceScheduler()
+
+async def poll_source(context):
+    """job بررسی یک کانال مبدأ و زمان‌بندی بررسی بعدی"""
+    source_url = context.job.data
+    source_scheduler.job_done(source_url)
+    channel = config_store.get_channel(source_url)
+    if channel is None or not channel.get('is_active', True):
+        return
+    if source_runner.in_flight(source_url):
+        # بررسی قبلی همین کانال (مثلاً پس از sync یا /startchannel) هنوز تمام نشده و خودش بررسی بعدی را زمان‌بندی می‌کند
+        metrics.inc('bot_tick_skipped_total', source=source_url)
+        return
+    owner = source_scheduler.owner
+    leased = False
+    poll_started = time.perf_counter()
+    try:
+        if owner:
+            if not state_store.acquire_lease(source_url, owner, SHARD_LEASE_TTL):
+                # پردازه دیگری (مثلاً shard قبلی پس از تغییر تقسیم‌بندی) هنوز این کانال را در دست دارد
+                return
+            leased = True
+        new_posts = await source_runner.start(context, channel)
+        record_tick(time.perf_counter() - poll_started, source_scheduler.interval(source_url), source_url)
+        source_scheduler.record(source_url, new_posts)
+    except sqlite3.OperationalError as e:
+        # مثلاً database is locked؛ این دور از دست می‌رود ولی بررسی بعدی زمان‌بندی می‌شود
+        logger.error(f"خطای پایگاه داده وضعیت در بررسی {source_url}: {str(e)}")
+    finally:
+        try:
+            if leased:
+                state_store.release_lease(source_url, owner)
+            state_store.commit()
+        except sqlite3.OperationalError as e:
+            logger.error(f"خطا در آزاد کردن قفل {source_url}: {str(e)}")
+        # ممکن است در حین بررسی کانال حذف یا متوقف شده باشد
+        channel = config_store.get_channel(source_url)
+        if channel is not None and channel.get('is_active', True) and not source_scheduler.is_scheduled(source_url):
+            # کانال با مدار باز تا پایان backoff (و کانال متوقف خودکار با بیشترین فاصله) بررسی نمی‌شود
+            source_scheduler.schedule(source_url, delay=circuit_breaker.retry_in(source_url))
+
+class HashRing:
+    """حلقه هش سازگار برای تقسیم source_urlها بین shardها"""
+
+    def __init__(self, nodes, vnodes=SHARD_VNODES):
+        self._ring = sorted((self._hash(f"{node}#{i}"), node) for node in nodes for i in range(vnodes))
+        self._keys = [key for key, _ in self._ring]
+
+    @staticmethod
+    def _hash(key):
+        return int.from_bytes(hashlib.md5(key.encode('utf-8')).digest()[:8], 'big')
+
+    def node_for(self, key):
+        return self._ring[bisect.bisect(self._keys, self._hash(key)) % len(self._ring)][1]
+
+def run_shard(index, count):
+    """نقطه شروع پردازه shard"""
+    asyncio.run(shard_main(index, count))
+
+async def shard_main(index, count):
+    """اسکرپ و ارسال برای بخشی از کانال‌ها بدون دریافت دستورات تلگرام"""
+    config = load_config()
+    application = ApplicationBuilder().token(config['bot_token']).updater(None).build()
+    source_scheduler.set_partition(index, count)
+
+    metrics_server = None
+    if config.get('metrics_port'):
+        metrics_server = start_metrics_server(config.get('metrics_host', METRICS_HOST), config['metrics_port'] + 1 + index)
+
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop_event.set)
+
+    await application.initialize()
+    await application.start()
+    source_scheduler.start(application)
+    application.job_queue.run_repeating(
+        reprobe_destinations,
+        interval=config.get('reachability_reprobe_interval', REACHABILITY_REPROBE_INTERVAL)
+    )
+    # تغییرات دستورات ادمین (در پردازه اصلی) از طریق فایل تنظیمات به shardها می‌رسد
+    application.job_queue.run_repeating(reload_config, interval=CONFIG_RELOAD_INTERVAL)
+    application.job_queue.run_repeating(flush_alerts, interval=config.get('alert_flush_interval', ALERT_FLUSH_INTERVAL))
+    # هر shard فقط ارسال‌های ناتمام کانال‌های خودش را دوباره انجام می‌دهد
+    application.job_queue.run_once(replay_outbox, when=0)
+    logger.info(f"shard {index + 1} از {count} شروع به کار کرد.")
+    try:
+        await stop_event.wait()
+    finally:
+        await alerts.flush(application)
+        await digests.flush_all(application)
+        await application.stop()
+        await application.shutdown()
+        if metrics_server is not None:
+            metrics_server.shutdown()
+        await source_runner.stop()
+        await delivery_queue.stop()
+        await close_http_client()
+        shutdown_parse_pool()
+        state_store.close()
+
+class ShardSupervisor:
+    """اجرای N پردازه shard و راه‌اندازی مجدد پردازه‌هایی که از کار افتاده‌اند"""
+
+    def __init__(self, count):
+        self.count = count
+        self._context = multiprocessing.get_context('spawn')
+        self._processes = {}
+
+    def _spawn(self, index):
+        process = self._context.Process(target=run_shard, args=(index, self.count), name=f"shard-{index}", daemon=True)
+        process.start()
+        self._processes[index] = process
+
+    def start(self):
+        # cursorها و قفل‌ها در state.db مشترک هستند؛ فایل تنظیمات قبل از شروع shardها نوشته می‌شود
+        config_store.flush()
+        for index in range(self.count):
+            self._spawn(index)
+        logger.info(f"{self.count} پردازه shard اجرا شد.")
+
+    def check(self):
+        for index, process in list(self._processes.items()):
+            if not process.is_alive():
+                logger.error(f"shard {index} با کد {process.exitcode} متوقف شد؛ اجرای مجدد...")
+                self._spawn(index)
+
+    def stop(self):
+        for process in self._processes.values():
+            if process.is_alive():
+                process.terminate()
+        for process in self._processes.values():
+            process.join(timeout=10)
+
+async def supervise_shards(context):
+    """بررسی دوره‌ای زنده بودن پردازه‌های shard"""
+    context.job.data.check()
+
+async def main(shards=None, run_mode=None):
     # لود تنظیمات
     config = load_config()
+    if run_mode is None:
+        run_mode = config.get('run_mode', 'polling')
+    if run_mode == 'webhook':
+        if not config.get('webhook_url'):
+            logger.error("برای حالت webhook باید webhook_url (آدرس عمومی reverse proxy) در config.json تنظیم شود!")
+            return
+        if config.get('webhook_secret') and not re.fullmatch(r'[A-Za-z0-9_-]{1,256}', config['webhook_secret']):
+            logger.error("webhook_secret فقط می‌تواند شامل حروف انگلیسی، عدد، _ و - (حداکثر 256 کاراکتر) باشد!")
+            return
 
     # دریافت توکن از تنظیمات
     bot_token = config.get('bot_token')
@@ -650,20 +3287,23 @@ async def main():
     application.add_handler(CommandHandler('startall', start_all))
     application.add_handler(CommandHandler('stop', stop_channel))
     application.add_handler(CommandHandler('startchannel', startchannel))
+    application.add_handler(CommandHandler('digest', set_digest))
     application.add_handler(CommandHandler('getconfig', get_config))
-
-    # تست اولیه ربات
+    application.add_handler(CommandHandler('stats', get_stats))
+    application.add_handler(CommandHandler('import', import_config))
+    # فایل ارسالی با کپشن /import (کپشن‌ها به CommandHandler نمی‌رسند)
+    application.add_handler(MessageHandler(filters.Document.ALL & filters.CaptionRegex(r'^/import(@\w+)?(\s|$)'), import_config))
+    application.add_handler(CommandHandler('export', export_config))
+
+    # سرور اختیاری متریک و سلامت
+    metrics_server = None
+    if config.get('metrics_port'):
+        metrics_server = start_metrics_server(config.get('metrics_host', METRICS_HOST), config['metrics_port'])
+
+    # تست اولیه ربات (initialize خودش get_me را فراخوانی می‌کند)؛ مقصدها بعداً بی‌صدا و هم‌زمان بررسی می‌شوند
     try:
-        bot_info = await application.bot.get_me()
-        logger.info(f"ربات راه‌اندازی شد: @{bot_info.username}")
-        for channel in config['channels']:
-            for dest_channel in channel['dest_channels']:
-                try:
-                    await application.bot.send_message(chat_id=dest_channel, text="تست: ربات با فرمت دقیق و خط خالی!")
-                except TelegramError as e:
-                    error_message = f"خطا در ارسال پیام تست به کانال مقصد {dest_channel}: {str(e)}"
-                    logger.error(error_message)
-                    await notify_admins(application, error_message)
+        await application.initialize()
+        logger.info(f"ربات راه‌اندازی شد: @{application.bot.username}")
     except TelegramError as e:
         logger.error(f"خطا در اتصال به تلگرام: {str(e)}")
         await notify_admins(application, f"خطا در اتصال به تلگرام: {str(e)}")
@@ -674,13 +3314,52 @@ async def main():
         logger.error("JobQueue در دسترس نیست! لطفاً python-telegram-bot[job-queue] را نصب کنید.")
         await notify_admins(application, "JobQueue در دسترس نیست!")
         return
-    application.job_queue.run_repeating(check_new_posts, interval=CHECK_INTERVAL, first=5)
+    if shards is None:
+        shards = config.get('shards', 0)
+    supervisor = None
+    if shards:
+        # فقط این پردازه دستورات تلگرام را دریافت می‌کند؛ اسکرپ و ارسال در shardها انجام می‌شود
+        supervisor = ShardSupervisor(shards)
+        supervisor.start()
+        application.job_queue.run_repeating(supervise_shards, interval=SHARD_CHECK_INTERVAL, data=supervisor)
+    elif config.get('adaptive_polling', True):
+        # هر کانال مبدأ job جداگانه با فاصله تطبیقی دارد
+        source_scheduler.start(application)
+    else:
+        application.job_queue.run_repeating(check_new_posts, interval=CHECK_INTERVAL, first=0)
+    if not shards:
+        application.job_queue.run_repeating(
+            reprobe_destinations,
+            interval=config.get('reachability_reprobe_interval', REACHABILITY_REPROBE_INTERVAL)
+        )
+        application.job_queue.run_once(replay_outbox, when=0)
+    application.job_queue.run_repeating(
+        compact_outbox, interval=config.get('outbox_compact_interval', OUTBOX_COMPACT_INTERVAL)
+    )
+    if config.get('config_hot_reload', False):
+        application.job_queue.run_repeating(reload_config, interval=CONFIG_RELOAD_INTERVAL)
+    application.job_queue.run_repeating(flush_alerts, interval=config.get('alert_flush_interval', ALERT_FLUSH_INTERVAL))
+    # بررسی مقصدها هم‌زمان با اولین دور اسکرپ اجرا می‌شود و آن را به تأخیر نمی‌اندازد
+    application.job_queue.run_once(startup_probe, when=0)
 
     # شروع ربات
     logger.info(f"ربات شروع به کار کرد. چک هر {CHECK_INTERVAL} ثانیه...")
-    await application.initialize()
     await application.start()
-    await application.updater.start_polling(drop_pending_updates=True)
+    if run_mode == 'webhook':
+        # تلگرام آپدیت‌ها را به webhook_url می‌فرستد و reverse proxy آن‌ها را به این گیرنده می‌رساند
+        await application.updater.start_webhook(
+            listen=config.get('webhook_listen', WEBHOOK_LISTEN),
+            port=config.get('webhook_port', WEBHOOK_PORT),
+            url_path=config.get('webhook_path', WEBHOOK_PATH),
+            webhook_url=config['webhook_url'],
+            secret_token=config.get('webhook_secret'),
+            drop_pending_updates=True
+        )
+        logger.info(f"دریافت آپدیت‌ها از طریق webhook: {config['webhook_url']}")
+    else:
+        await application.updater.start_polling(drop_pending_updates=True)
+    STARTUP_STATS['ready'] = time.monotonic() - STARTED_AT
+    logger.info(f"ربات {STARTUP_STATS['ready']:.2f} ثانیه پس از شروع آماده شد.")
 
     # نگه داشتن ربات فعال
     try:
@@ -689,7 +3368,25 @@ async def main():
     except KeyboardInterrupt:
         logger.info("ربات متوقف شد.")
     finally:
+        await alerts.flush(application)
+        await digests.flush_all(application)
+        if application.updater.running:
+            await application.updater.stop()
         await application.stop()
+        if supervisor is not None:
+            supervisor.stop()
+        if metrics_server is not None:
+            metrics_server.shutdown()
+        await source_runner.stop()
+        await delivery_queue.stop()
+        await close_http_client()
+        shutdown_parse_pool()
+        config_store.flush()
+        state_store.close()
 
 if __name__ == '__main__':
-    asyncio.run(main())
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='ربات کپی پست از کانال‌های تلگرام')
+    parser.add_argument('--shards', type=int, default=None, help='تعداد پردازه‌های اسکرپ و ارسال (حالت shard)')
+    parser.add_argument('--mode', choices=('polling', 'webhook'), default=None, help='نحوه دریافت دستورات (پیش‌فرض run_mode در تنظیمات یا polling)')
+    args = parser.parse_args()
+    asyncio.run(main(shards=args.shards, run_mode=args.mode))
\ No newline at end of file